@@ -0,0 +1,214 @@
+"""Сценарные бенчмарки jirainsight на моке Insight (mock_insight.py).
+
+load          - полная загрузка типа Device;
+references    - чтение ссылочных атрибутов Location и Uplinks у всех
+                устройств;
+mixer_plan    - построение плана Mixer без записи (dry-run);
+mixer_execute - выполнение этого плана: создание ссылок, новых объектов
+                и изменение существующих.
+
+Источник для Mixer меняет Ports у 10% устройств, добавляет 5% новых и
+ссылается на 1% новых площадок. Каждый прогон идёт в отдельном процессе
+со своим сервером, поэтому счётчики запросов не смешиваются.
+Пик памяти - максимум памяти, выделенной за время шага, по tracemalloc.
+Его меряем отдельным прогоном: tracemalloc сильно замедляет код.
+
+    python benchmarks/insight_scenarios.py --sizes 1000 10000 100000
+    python benchmarks/insight_scenarios.py --sizes 10000 --latency 0.005 --json result.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARKS_DIR, ".."))
+
+from jirainsight import DataSource, Insight, InsightSchema, Mixer  # noqa: E402
+
+SCENARIOS = ("load", "references", "mixer_plan", "mixer_execute")
+
+
+def request_counts(insight):
+    return {
+        f"{item['method']} {item['endpoint']}": item["count"]
+        for item in insight.metrics.summary()["endpoints"]}
+
+
+def make_source(object_type, size):
+    locations = max(size // 10, 1)
+    records = []
+    for number in range(size + size // 20):
+        ports = number % 48
+        if number % 10 == 0:
+            ports += 1
+        location = f"loc{number % locations}"
+        if number % 100 == 0:
+            location = f"new-loc{number}"
+        records.append({
+            "Name": f"dev{number}",
+            "Ports": ports,
+            "Active": True,
+            "Location": location,
+            "Uplinks": [
+                f"loc{(number + shift) % locations}" for shift in (1, 2)],
+        })
+    return DataSource(records, object_type)
+
+
+def run_scenario(scenario, url, size, workers, trace_memory=False):
+    insight = Insight(url, "login", "password", write_workers=workers)
+    schema = InsightSchema(insight, "CMDB")
+    object_type = schema.get_object_type("Device")
+    steps = {}
+    if scenario == "load":
+        steps["load"] = lambda: len(object_type.objects)
+    elif scenario == "references":
+        object_type.objects
+
+        def read_references():
+            count = 0
+            for insight_object in object_type.objects.values():
+                for name in ("Location", "Uplinks"):
+                    count += len(insight_object.attributes[name].value or [])
+            return count
+        steps["references"] = read_references
+    else:
+        source = make_source(object_type, size)
+        plans = []
+        steps["mixer_plan"] = lambda: plans.append(
+            Mixer(source, schema).build_plan(create_references=False)) or (
+            plans[0].stats)
+        if scenario == "mixer_execute":
+            steps["mixer_execute"] = lambda: {
+                name: sum(result.success for result in results)
+                for name, results in plans[0].execute(
+                    schema, workers).items() if isinstance(results, list)}
+    results = []
+    for name, step in steps.items():
+        counts_before = request_counts(insight)
+        if trace_memory:
+            # Перезапуск обнуляет счётчики: пик считается только по шагу
+            tracemalloc.stop()
+            tracemalloc.start()
+        started = time.perf_counter()
+        value = step()
+        wall = time.perf_counter() - started
+        peak_memory = None
+        if trace_memory:
+            peak_memory = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        counts = {
+            endpoint: count - counts_before.get(endpoint, 0)
+            for endpoint, count in request_counts(insight).items()
+            if count - counts_before.get(endpoint, 0)}
+        results.append({
+            "scenario": name,
+            "size": size,
+            "wall": wall,
+            "requests": sum(counts.values()),
+            "endpoints": counts,
+            "peak_memory": peak_memory,
+            "result": value,
+        })
+    # Для mixer_execute шаг построения плана только подготовка
+    return [item for item in results if item["scenario"] == scenario]
+
+
+def start_server(size, fanout, latency):
+    server = subprocess.Popen(
+        [sys.executable, os.path.join(BENCHMARKS_DIR, "mock_insight.py"),
+         "--devices", str(size), "--fanout", str(fanout),
+         "--latency", str(latency)],
+        stdout=subprocess.PIPE, text=True)
+    url = server.stdout.readline().strip()
+    if not url:
+        server.kill()
+        raise RuntimeError("Мок Insight не запустился")
+    return server, url
+
+
+def run_child(scenario, size, args, trace_memory=False):
+    server, url = start_server(size, args.fanout, args.latency)
+    command = [
+        sys.executable, os.path.abspath(__file__), "--child", scenario,
+        "--url", url, "--sizes", str(size), "--workers", str(args.workers)]
+    if trace_memory:
+        command.append("--trace-memory")
+    try:
+        output = subprocess.run(
+            command, stdout=subprocess.PIPE, text=True, check=True).stdout
+    finally:
+        server.terminate()
+        server.wait()
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def run_isolated(scenario, size, args):
+    # Время и запросы - из прогона без tracemalloc, память - из второго
+    results = run_child(scenario, size, args)
+    if args.memory:
+        peaks = {
+            item["scenario"]: item["peak_memory"]
+            for item in run_child(scenario, size, args, trace_memory=True)}
+        for item in results:
+            item["peak_memory"] = peaks.get(item["scenario"])
+    return results
+
+
+def format_memory(value):
+    if value is None:
+        return "н/д"
+    return f"{value / 2 ** 20:.1f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Бенчмарки jirainsight на моке Insight")
+    parser.add_argument("--sizes", type=int, nargs="+",
+                        default=[1000, 10000, 100000])
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS,
+                        default=list(SCENARIOS))
+    parser.add_argument("--fanout", type=int, default=2)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--json", help="сохранить результаты в файл")
+    parser.add_argument("--no-memory", dest="memory", action="store_false",
+                        help="не замерять память (вдвое быстрее)")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help=argparse.SUPPRESS)
+    parser.add_argument("--child", choices=SCENARIOS, help=argparse.SUPPRESS)
+    parser.add_argument("--url", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        results = run_scenario(
+            args.child, args.url, args.sizes[0], args.workers,
+            args.trace_memory)
+        print(json.dumps(results))
+        return
+
+    print(f"{'сценарий':<14} {'объектов':>9} {'время, с':>9} "
+          f"{'запросов':>9} {'пик, МБ':>9}")
+    all_results = []
+    for size in args.sizes:
+        for scenario in args.scenarios:
+            for result in run_isolated(scenario, size, args):
+                all_results.append(result)
+                print(f"{result['scenario']:<14} {size:>9} "
+                      f"{result['wall']:>9.2f} {result['requests']:>9} "
+                      f"{format_memory(result['peak_memory']):>9}",
+                      flush=True)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as result_file:
+            json.dump({
+                "fanout": args.fanout, "latency": args.latency,
+                "workers": args.workers, "results": all_results,
+            }, result_file, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
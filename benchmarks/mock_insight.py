@@ -0,0 +1,455 @@
+"""Локальный мок Insight REST API для бенчмарков.
+
+Синтетические схемы CMDB, CMDB2, ... (параметр schemas) из двух типов:
+    Location - площадки, devices // 10 объектов (не меньше одной);
+    Device   - устройства со ссылкой на площадку и fanout ссылками
+               Uplinks на другие площадки.
+Id типов и атрибутов схемы N сдвинуты на 10 * N и 100 * N.
+
+Поддерживаются /objectschema/list, /objectschema/{id},
+/objectschema/{id}/objecttypes/flat, атрибуты схемы и типа,
+/iql/objects с постраничной выдачей и pageSize, а также чтение,
+создание, изменение и удаление /object/{id}. Задержка latency
+добавляется к каждому запросу.
+
+    python benchmarks/mock_insight.py --devices 10000 --fanout 3 --port 8080
+"""
+import argparse
+import json
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+API_PREFIX = "/rest/insight/1.0"
+LOCATION_TYPE_ID = 10
+
+TEXT, INTEGER, BOOLEAN = 0, 1, 2
+
+
+def make_attribute(attribute_id, name, object_type_id, default_type=TEXT,
+                   reference_type_id=None, label=False):
+    attribute = {
+        "id": attribute_id,
+        "name": name,
+        "objectType": {"id": object_type_id},
+        "label": label,
+        "type": 0,
+        "defaultType": {"id": default_type},
+    }
+    if reference_type_id is not None:
+        attribute["type"] = 1
+        attribute["referenceObjectTypeId"] = reference_type_id
+        del attribute["defaultType"]
+    return attribute
+
+
+def make_schema_attributes(schema_id):
+    location_type_id = LOCATION_TYPE_ID * schema_id
+    device_type_id = location_type_id + 1
+    base = 100 * schema_id
+    return [
+        make_attribute(base, "Key", location_type_id),
+        make_attribute(base + 1, "Name", location_type_id, label=True),
+        make_attribute(base + 2, "Address", location_type_id),
+        make_attribute(base + 10, "Key", device_type_id),
+        make_attribute(base + 11, "Name", device_type_id, label=True),
+        make_attribute(base + 12, "Ports", device_type_id, INTEGER),
+        make_attribute(base + 13, "Active", device_type_id, BOOLEAN),
+        make_attribute(base + 14, "Location", device_type_id,
+                       reference_type_id=location_type_id),
+        make_attribute(base + 15, "Uplinks", device_type_id,
+                       reference_type_id=location_type_id),
+    ]
+
+
+class MockInsightState:
+    IQL_OBJECT_TYPE = re.compile(r'objectType\s*=\s*"([^"]*)"')
+    IQL_OBJECT_TYPE_ID = re.compile(r"objectTypeId\s*=\s*(\d+)")
+    IQL_OBJECT_IDS = re.compile(r"objectId\s+IN\s*\(([^)]*)\)", re.I)
+    IQL_UPDATED = re.compile(r"updated\s*>=\s*now\(-(\d+)m\)")
+
+    def __init__(self, devices=1000, locations=None, fanout=2, latency=0.0,
+                 schemas=1):
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.request_counts = Counter()
+        self.schemas = {}
+        self.attributes_json = {}
+        self.object_types_json = {}
+        for schema_id in range(1, schemas + 1):
+            key = "CMDB" if schema_id == 1 else f"CMDB{schema_id}"
+            self.schemas[schema_id] = {
+                "id": schema_id, "name": key, "objectSchemaKey": key,
+                "description": "", "updated": "2026-01-01T00:00:00.000Z"}
+            self.attributes_json[schema_id] = make_schema_attributes(
+                schema_id)
+            self.object_types_json[LOCATION_TYPE_ID * schema_id] = {
+                "id": LOCATION_TYPE_ID * schema_id, "name": "Location",
+                "objectSchemaId": schema_id}
+            self.object_types_json[LOCATION_TYPE_ID * schema_id + 1] = {
+                "id": LOCATION_TYPE_ID * schema_id + 1, "name": "Device",
+                "objectSchemaId": schema_id}
+        self.attributes = {
+            attribute["id"]: attribute
+            for attributes in self.attributes_json.values()
+            for attribute in attributes}
+        self.label_attributes = {
+            attribute["objectType"]["id"]: attribute["id"]
+            for attribute in self.attributes.values() if attribute["label"]}
+        self.objects = {}
+        self.by_label = {}
+        self.by_key = {}
+        self.next_id = 1
+        # Версия данных: сбрасывает закешированные результаты IQL
+        self.version = 0
+        self.iql_results = {}
+        for schema_id in self.schemas:
+            self.populate(schema_id, devices, locations, fanout)
+
+    def populate(self, schema_id, devices, locations, fanout):
+        location_type_id = LOCATION_TYPE_ID * schema_id
+        base = 100 * schema_id
+        locations = locations or max(devices // 10, 1)
+        location_ids = []
+        for number in range(locations):
+            location_ids.append(self.add_object(location_type_id, {
+                base + 1: [f"loc{number}"],
+                base + 2: [f"Street {number}"],
+            })["id"])
+        for number in range(devices):
+            uplinks = [
+                location_ids[(number + shift) % locations]
+                for shift in range(1, fanout + 1)]
+            self.add_object(location_type_id + 1, {
+                base + 11: [f"dev{number}"],
+                base + 12: [str(number % 48)],
+                base + 13: ["true"],
+                base + 14: [location_ids[number % locations]],
+                base + 15: uplinks,
+            })
+
+    def count_request(self, method, path):
+        endpoint = re.sub(r"/\d+(?=/|$)", "/{id}", path)
+        with self.lock:
+            self.request_counts[f"{method} {endpoint}"] += 1
+
+    def make_reference(self, object_id):
+        insight_object = self.objects[object_id]
+        return {
+            "referencedObject": {
+                "id": object_id,
+                "label": insight_object["label"],
+                "objectKey": insight_object["objectKey"],
+            },
+            "displayValue": insight_object["label"],
+        }
+
+    def find_reference(self, object_type_id, value):
+        # Ссылку передают id, objectKey или именем объекта
+        if isinstance(value, int):
+            return value
+        insight_object = self.by_key.get(value)
+        if insight_object is None:
+            insight_object = self.by_label.get((object_type_id, value))
+        if insight_object is None and str(value).isdigit():
+            insight_object = self.objects.get(int(value))
+        if insight_object is None:
+            raise KeyError(value)
+        return insight_object["id"]
+
+    def add_object(self, object_type_id, values):
+        object_id = self.next_id
+        self.next_id += 1
+        now = self.now()
+        object_type_json = self.object_types_json[object_type_id]
+        schema = self.schemas[object_type_json["objectSchemaId"]]
+        insight_object = {
+            "id": object_id,
+            "label": "",
+            "objectKey": f"{schema['objectSchemaKey']}-{object_id}",
+            "objectType": dict(object_type_json),
+            "created": now,
+            "updated": now,
+            "attributes": [],
+        }
+        self.objects[object_id] = insight_object
+        self.by_key[insight_object["objectKey"]] = insight_object
+        self.set_values(insight_object, values)
+        return insight_object
+
+    def set_values(self, insight_object, values):
+        object_type_id = insight_object["objectType"]["id"]
+        attributes = {
+            attribute["objectTypeAttributeId"]: attribute
+            for attribute in insight_object["attributes"]}
+        for attribute_id, attribute_values in values.items():
+            attribute = self.attributes[int(attribute_id)]
+            reference_type_id = attribute.get("referenceObjectTypeId")
+            if reference_type_id is not None:
+                values_json = [
+                    self.make_reference(
+                        self.find_reference(reference_type_id, value))
+                    for value in attribute_values]
+            else:
+                values_json = [
+                    {"value": value, "displayValue": value}
+                    for value in attribute_values]
+            attributes[attribute["id"]] = {
+                "id": insight_object["id"] * 1000 + attribute["id"],
+                "objectTypeAttributeId": attribute["id"],
+                "objectAttributeValues": values_json,
+            }
+        insight_object["attributes"] = list(attributes.values())
+        label = attributes.get(self.label_attributes[object_type_id])
+        if label and label["objectAttributeValues"]:
+            self.by_label.pop((object_type_id, insight_object["label"]), None)
+            insight_object["label"] = label["objectAttributeValues"][0]["value"]
+            self.by_label[(object_type_id, insight_object["label"])] = (
+                insight_object)
+        insight_object["updated"] = self.now()
+        self.version += 1
+
+    def delete_object(self, object_id):
+        insight_object = self.objects.pop(object_id)
+        self.by_key.pop(insight_object["objectKey"], None)
+        self.by_label.pop(
+            (insight_object["objectType"]["id"], insight_object["label"]),
+            None)
+        self.version += 1
+
+    @staticmethod
+    def now():
+        return time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime())
+
+    def object_types(self, schema_id, include_counts=False):
+        # Как Insight: objectCount только с includeObjectCounts=true
+        object_types = [
+            dict(object_type_json)
+            for object_type_json in self.object_types_json.values()
+            if object_type_json["objectSchemaId"] == schema_id]
+        if include_counts:
+            counts = Counter(
+                insight_object["objectType"]["id"]
+                for insight_object in self.objects.values())
+            for object_type_json in object_types:
+                object_type_json["objectCount"] = counts[
+                    object_type_json["id"]]
+        return object_types
+
+    def search(self, iql, schema_id=None):
+        # Результат запроса кешируется до следующего изменения данных,
+        # чтобы постраничная выдача не пересчитывала фильтр на каждой странице
+        cache_key = (iql, schema_id, self.version)
+        result = self.iql_results.get(cache_key)
+        if result is not None:
+            return result
+        match = self.IQL_OBJECT_IDS.search(iql or "")
+        if match:
+            object_ids = [
+                int(item) for item in match.group(1).split(",")
+                if item.strip()]
+            result = [
+                self.objects[object_id] for object_id in object_ids
+                if object_id in self.objects]
+        else:
+            result = list(self.objects.values())
+        if schema_id is not None:
+            result = [
+                insight_object for insight_object in result
+                if insight_object["objectType"]["objectSchemaId"] == schema_id]
+        match = self.IQL_OBJECT_TYPE.search(iql or "")
+        if match:
+            result = [
+                insight_object for insight_object in result
+                if insight_object["objectType"]["name"] == match.group(1)]
+        match = self.IQL_OBJECT_TYPE_ID.search(iql or "")
+        if match:
+            result = [
+                insight_object for insight_object in result
+                if insight_object["objectType"]["id"] == int(match.group(1))]
+        match = self.IQL_UPDATED.search(iql or "")
+        if match:
+            since = time.strftime(
+                "%Y-%m-%dT%H:%M:%S.000Z",
+                time.gmtime(time.time() - int(match.group(1)) * 60))
+            result = [
+                insight_object for insight_object in result
+                if insight_object["updated"] >= since]
+        self.iql_results = {cache_key: result}
+        return result
+
+
+class MockInsightHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def send_json(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(data)
+
+    def read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        data = self.rfile.read(length)
+        return json.loads(data) if data else None
+
+    @staticmethod
+    def payload_values(payload):
+        return {
+            attribute["objectTypeAttributeId"]: [
+                value["value"] for value in attribute["objectAttributeValues"]]
+            for attribute in payload["attributes"]}
+
+    def handle_request(self):
+        state = self.server.state
+        if state.latency:
+            time.sleep(state.latency)
+        url = urlsplit(self.path)
+        query = {
+            name: values[0] for name, values in parse_qs(url.query).items()}
+        path = url.path[len(API_PREFIX):] if url.path.startswith(
+            API_PREFIX) else url.path
+        method = self.command
+        state.count_request(method, path)
+        with state.lock:
+            status, body = self.route(state, method, path, query)
+        self.send_json(status, body)
+
+    def route(self, state, method, path, query):
+        if path == "/objectschema/list":
+            return 200, {"objectschemas": list(state.schemas.values())}
+        match = re.fullmatch(r"/objectschema/(\d+)(/.*)?", path)
+        if match and int(match.group(1)) not in state.schemas:
+            return 404, {"errorMessages": [f"No schema {match.group(1)}"]}
+        if match and match.group(2) is None:
+            return 200, state.schemas[int(match.group(1))]
+        match = re.fullmatch(r"/objectschema/(\d+)/objecttypes/flat", path)
+        if match:
+            return 200, state.object_types(
+                int(match.group(1)),
+                query.get("includeObjectCounts") == "true")
+        match = re.fullmatch(r"/objectschema/(\d+)/attributes", path)
+        if match:
+            return 200, state.attributes_json[int(match.group(1))]
+        match = re.fullmatch(r"/objecttype/(\d+)/attributes", path)
+        if match:
+            object_type_id = int(match.group(1))
+            return 200, [
+                attribute for attribute in state.attributes.values()
+                if attribute["objectType"]["id"] == object_type_id]
+        match = re.fullmatch(r"/objecttype/(\d+)", path)
+        if match:
+            object_type_json = state.object_types_json.get(
+                int(match.group(1)))
+            if object_type_json is None:
+                return 404, {"errorMessages": ["No object type"]}
+            return 200, object_type_json
+        if path == "/iql/objects":
+            schema_id = query.get("objectSchemaId")
+            result = state.search(
+                query.get("iql"), int(schema_id) if schema_id else None)
+            per_page = int(query.get("resultPerPage", 25))
+            page = int(query.get("page", 1))
+            return 200, {
+                "objectEntries": result[(page - 1) * per_page:page * per_page],
+                "pageSize": max(1, -(-len(result) // per_page)),
+                "pageNumber": page,
+                "totalFilterCount": len(result),
+            }
+        if path == "/object/create" and method == "POST":
+            payload = self.read_json()
+            try:
+                return 201, state.add_object(
+                    payload["objectTypeId"], self.payload_values(payload))
+            except KeyError as error:
+                return 400, {"errors": {"reference": f"Not found {error}"}}
+        match = re.fullmatch(r"/object/(\d+)", path)
+        if match:
+            object_id = int(match.group(1))
+            insight_object = state.objects.get(object_id)
+            if insight_object is None:
+                return 404, {"errorMessages": [f"No object {object_id}"]}
+            if method == "PUT":
+                try:
+                    state.set_values(
+                        insight_object, self.payload_values(self.read_json()))
+                except KeyError as error:
+                    return 400, {"errors": {"reference": f"Not found {error}"}}
+            elif method == "DELETE":
+                state.delete_object(object_id)
+                return 200, {}
+            return 200, insight_object
+        return 404, {"errorMessages": [f"Unknown path {path}"]}
+
+    do_GET = do_POST = do_PUT = do_DELETE = do_HEAD = handle_request
+
+
+class MockInsightServer:
+    # Сервер в фоновом потоке: with MockInsightServer(devices=1000) as url
+    def __init__(self, host="127.0.0.1", port=0, **state_options):
+        self.server = ThreadingHTTPServer((host, port), MockInsightHandler)
+        self.server.daemon_threads = True
+        self.server.state = MockInsightState(**state_options)
+        self.thread = None
+
+    @property
+    def state(self):
+        return self.server.state
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread = threading.Thread(
+            target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self.url
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Мок Insight REST API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--devices", type=int, default=1000)
+    parser.add_argument("--locations", type=int, default=None)
+    parser.add_argument("--fanout", type=int, default=2)
+    parser.add_argument("--schemas", type=int, default=1)
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="задержка каждого ответа, секунды")
+    args = parser.parse_args()
+    server = MockInsightServer(
+        args.host, args.port, devices=args.devices, locations=args.locations,
+        fanout=args.fanout, latency=args.latency, schemas=args.schemas)
+    # Первая строка вывода - адрес, её читает insight_scenarios.py
+    print(server.url, flush=True)
+    try:
+        server.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server.server_close()
+
+
+if __name__ == "__main__":
+    main()
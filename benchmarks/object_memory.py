@@ -0,0 +1,136 @@
+"""Сравнение памяти и времени создания InsightObject.
+
+baseline - классы до перехода на раскладки типа (BaselineObject ниже):
+           объект хранит исходный JSON и сразу создаёт атрибут на каждое
+           значение, у классов нет __slots__;
+lazy     - исходный JSON хранится, атрибуты разбираются при обращении;
+compact  - исходный JSON не хранится, значения лежат в раскладке типа.
+
+    python benchmarks/object_memory.py 200000
+"""
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from jirainsight import Insight, InsightObject, InsightSchema  # noqa: E402
+
+SCHEMA = {"id": 1, "name": "CMDB", "objectSchemaKey": "CMDB"}
+ATTRIBUTES = [
+    {"id": 100 + number, "name": f"Attribute {number}", "type": 0,
+     "defaultType": {"id": 0 if number % 3 else 1}}
+    for number in range(20)
+]
+
+
+class BaselineObject:
+    # Прежние InsightObject и InsightObjectAttribute, только создание
+    # объекта: обращения к API здесь не нужны
+    def __init__(self, insight, object_id, object_json):
+        self.insight = insight
+        self.id = object_id
+        self.load_json(object_json)
+
+    def load_json(self, object_json):
+        self.object_json = object_json
+        self.name = self.object_json["label"]
+        self.key = self.object_json.get("objectKey", None)
+        self.object_schema = self.insight.object_schemas[
+            self.object_json["objectType"]["objectSchemaId"]
+        ]
+        self.attributes = {}
+        for attribute_json in self.object_json["attributes"]:
+            attribute_object = BaselineObjectAttribute(
+                self,
+                attribute_json["objectTypeAttributeId"],
+                attribute_json["objectAttributeValues"],
+            )
+            self.attributes[attribute_object.name] = attribute_object
+
+
+class BaselineObjectAttribute:
+    def __init__(self, insight_object, attribute_id, values_json=None):
+        self.insight_object = insight_object
+        self.id = attribute_id
+        self.object_type_attribute = (
+            self.insight_object.object_schema.object_type_attributes[
+                self.id
+                ]
+        )
+        self.name = self.object_type_attribute.name
+        self.values_json = values_json
+
+
+def make_insight(keep_object_json):
+    insight = Insight("http://localhost", "login", "password",
+                      keep_object_json=keep_object_json)
+    insight.cache.set("metadata", "schemas", [SCHEMA])
+    schema = InsightSchema(insight, SCHEMA["name"])
+    insight.cache.set(
+        "attributes", ("objectschema", schema.id),
+        schema.build_object_type_attributes(schema, ATTRIBUTES))
+    return insight
+
+
+def make_object_json(object_id):
+    return {
+        "id": object_id,
+        "label": f"object-{object_id}",
+        "objectKey": f"CMDB-{object_id}",
+        "objectType": {"id": 10, "name": "Servers", "objectSchemaId": 1},
+        "attributes": [
+            {
+                "objectTypeAttributeId": attribute["id"],
+                "objectAttributeValues": [{
+                    "value": str(object_id * attribute["id"]),
+                    "displayValue": str(object_id * attribute["id"]),
+                }],
+            }
+            for attribute in ATTRIBUTES
+        ],
+    }
+
+
+def build(insight, mode, count):
+    # Время считаем только на создание объектов, без генерации JSON
+    elapsed = 0.0
+    objects = []
+    for object_id in range(1, count + 1):
+        object_json = make_object_json(object_id)
+        started = time.perf_counter()
+        if mode == "baseline":
+            insight_object = BaselineObject(insight, object_id, object_json)
+        else:
+            insight_object = InsightObject(insight, object_id, object_json)
+        elapsed += time.perf_counter() - started
+        objects.append(insight_object)
+    return objects, elapsed
+
+
+def measure(mode, count):
+    insight = make_insight(keep_object_json=mode != "compact")
+    objects, elapsed = build(insight, mode, count)
+    del objects
+    # Память меряем отдельным прогоном, tracemalloc сильно замедляет код
+    tracemalloc.start()
+    objects, _ = build(insight, mode, count)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del objects
+    return elapsed, current, peak
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    print(f"{count} объектов по {len(ATTRIBUTES)} атрибутов")
+    print(f"{'режим':<9} {'время, с':>9} {'память, МБ':>11} {'пик, МБ':>9}")
+    for mode in ("baseline", "lazy", "compact"):
+        elapsed, current, peak = measure(mode, count)
+        print(f"{mode:<9} {elapsed:>9.2f} {current / 2 ** 20:>11.1f} "
+              f"{peak / 2 ** 20:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,29 +5,855 @@ import requests
 import re
 import logging
 import json
+import asyncio
+import contextvars
+import csv
+import gzip
+import mmap
+import operator
+import os
+import random
+import threading
+import sys
+import time
+import zlib
+from array import array
+from datetime import datetime, timezone
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from email.utils import parsedate_to_datetime
+from requests.adapters import HTTPAdapter
+from urllib.parse import urlsplit
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+DATE_FORMATS = (
+    "%Y-%m-%dT%H:%M:%S.%fZ", "%Y-%m-%dT%H:%M:%S.%f%z",
+    "%Y-%m-%dT%H:%M:%S", "%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M",
+    "%Y-%m-%d", "%d.%m.%Y %H:%M", "%d.%m.%Y", "%d/%m/%Y",
+)
+
+# Символы, которые в JSON массиве могут идти сразу за значением
+JSON_ARRAY_DELIMITERS = (",", "]", " ", "\t", "\r", "\n")
+
+
+def parse_date(value):
+    # Дата из Insight или источника, None если формат не распознан
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(value.strip(), date_format)
+        except ValueError:
+            continue
+
+
+# HTTP статус последнего асинхронного запроса в текущей задаче asyncio,
+# аналог Insight.local.last_status для потоков
+ASYNC_LAST_STATUS = contextvars.ContextVar("async_last_status", default=None)
+
+
+class DuplicateObjectError(LookupError):
+    pass
+
+
+class DisableThresholdError(ValueError):
+    pass
+
+
+class WriteResult:
+    def __init__(self, key, success, status=None, error=None, latency=None,
+                 result=None):
+        self.key = key
+        self.success = success
+        self.status = status
+        self.error = error
+        self.latency = latency
+        self.result = result
+
+    def __str__(self):
+        state = "OK" if self.success else f"Ошибка: {self.error}"
+        return f"WriteResult: {self.key} HTTP {self.status} {state}"
+
+    def as_dict(self):
+        return {
+            "key": self.key,
+            "success": self.success,
+            "status": self.status,
+            "error": self.error,
+            "latency": self.latency,
+        }
+
+
+class RateLimiter:
+    # Token bucket: не больше rate запросов в секунду, всплеск до burst
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(1, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def __str__(self):
+        return f"RateLimiter: {self.rate}/с"
+
+    def acquire(self):
+        while True:
+            wait = self.take()
+            if not wait:
+                return
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        while True:
+            wait = self.take()
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+    def take(self):
+        # Забирает токен и возвращает 0 или сколько ждать до следующего
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.capacity,
+                self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+
+class InsightMetrics:
+    # Границы корзин гистограммы задержек запросов, в секундах
+    LATENCY_BUCKETS = (
+        0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+    API_PREFIX = re.compile(r"^.*/rest/insight/1\.0")
+    NUMERIC_ID = re.compile(r"/\d+(?=/|$)")
+
+    def __init__(self, hooks=None, cache=None):
+        # hook(event, data): event - "request" или "phase"
+        self.hooks = list(hooks or [])
+        # Кеш, статистика попаданий которого попадает в сводку
+        self.cache = cache
+        self.lock = threading.Lock()
+        self.endpoints = {}
+        self.phases = {}
+
+    def __str__(self):
+        requests_count = sum(
+            stats["count"] for stats in self.endpoints.values())
+        return f"InsightMetrics: {requests_count} запросов"
+
+    def add_hook(self, hook):
+        self.hooks.append(hook)
+
+    def remove_hook(self, hook):
+        self.hooks.remove(hook)
+
+    def reset(self):
+        with self.lock:
+            self.endpoints = {}
+            self.phases = {}
+
+    @classmethod
+    def endpoint_template(cls, url):
+        # /rest/insight/1.0/object/123/history -> /object/{id}/history
+        path = cls.API_PREFIX.sub("", urlsplit(url).path)
+        return cls.NUMERIC_ID.sub("/{id}", path) or "/"
+
+    def observe_request(self, method, url, status=None, latency=0.0, size=0,
+                        retries=0, error=None):
+        endpoint = self.endpoint_template(url)
+        method = method.upper()
+        failed = error is not None or status is None or status >= 400
+        with self.lock:
+            stats = self.endpoints.get((method, endpoint))
+            if stats is None:
+                stats = self.endpoints[(method, endpoint)] = {
+                    "count": 0, "errors": 0, "retries": 0, "bytes": 0,
+                    "latency_sum": 0.0, "latency_max": 0.0, "statuses": {},
+                    "buckets": [0] * (len(self.LATENCY_BUCKETS) + 1)}
+            stats["count"] += 1
+            stats["errors"] += failed
+            stats["retries"] += retries
+            stats["bytes"] += size
+            stats["latency_sum"] += latency
+            stats["latency_max"] = max(stats["latency_max"], latency)
+            status_key = str(status) if status is not None else "error"
+            stats["statuses"][status_key] = (
+                stats["statuses"].get(status_key, 0) + 1)
+            bucket = 0
+            while (bucket < len(self.LATENCY_BUCKETS)
+                   and latency > self.LATENCY_BUCKETS[bucket]):
+                bucket += 1
+            stats["buckets"][bucket] += 1
+        logging.debug(
+            f"{method} {endpoint}: {status_key}, {latency:.3f} с, "
+            f"{size} байт, повторов {retries}")
+        self.emit("request", {
+            "method": method, "endpoint": endpoint, "url": url,
+            "status": status, "latency": latency, "bytes": size,
+            "retries": retries, "error": repr(error) if error else None})
+
+    @contextmanager
+    def phase(self, name):
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe_phase(name, time.monotonic() - started)
+
+    def observe_phase(self, name, seconds):
+        with self.lock:
+            stats = self.phases.setdefault(name, {"count": 0, "seconds": 0.0})
+            stats["count"] += 1
+            stats["seconds"] += seconds
+        logging.info(f"Этап {name}: {seconds:.3f} с")
+        self.emit("phase", {"phase": name, "seconds": seconds})
+
+    def emit(self, event, data):
+        # Ошибка в обработчике не должна прерывать синхронизацию
+        for hook in list(self.hooks):
+            try:
+                hook(event, data)
+            except Exception as error:
+                logging.warning(f"Обработчик метрик {hook!r}: {error!r}")
+
+    def summary(self):
+        with self.lock:
+            endpoints = []
+            for (method, endpoint), stats in sorted(
+                    self.endpoints.items(),
+                    key=lambda item: -item[1]["latency_sum"]):
+                cumulative = 0
+                buckets = {}
+                for bound, count in zip(
+                        self.LATENCY_BUCKETS + ("+Inf",), stats["buckets"]):
+                    cumulative += count
+                    buckets[str(bound)] = cumulative
+                endpoints.append({
+                    "method": method, "endpoint": endpoint,
+                    "count": stats["count"], "errors": stats["errors"],
+                    "retries": stats["retries"], "bytes": stats["bytes"],
+                    "statuses": dict(stats["statuses"]),
+                    "latency": {
+                        "sum": stats["latency_sum"],
+                        "avg": stats["latency_sum"] / stats["count"],
+                        "max": stats["latency_max"],
+                        "buckets": buckets,
+                    },
+                })
+            result = {
+                "endpoints": endpoints,
+                "phases": {
+                    name: dict(stats) for name, stats in self.phases.items()},
+            }
+        if self.cache is not None:
+            result["cache"] = self.cache.get_stats()
+        return result
+
+    def to_json(self, indent=None):
+        return json.dumps(self.summary(), ensure_ascii=False, indent=indent)
+
+    @staticmethod
+    def prometheus_labels(**labels):
+        values = []
+        for name, value in labels.items():
+            value = str(value).replace("\\", "\\\\").replace(
+                '"', '\\"').replace("\n", "\\n")
+            values.append(f'{name}="{value}"')
+        return "{" + ",".join(values) + "}"
+
+    def to_prometheus(self, prefix="jirainsight"):
+        # Текстовый формат Prometheus (exposition format 0.0.4)
+        summary = self.summary()
+        labels = self.prometheus_labels
+        lines = []
+
+        def metric(name, metric_type, help_text, samples):
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} {metric_type}")
+            for suffix, sample_labels, value in samples:
+                lines.append(f"{prefix}_{name}{suffix}{sample_labels} {value}")
+
+        endpoints = summary["endpoints"]
+        for name, field, help_text in (
+                ("requests_total", "count", "Insight API requests"),
+                ("request_errors_total", "errors", "Failed Insight API requests"),
+                ("request_retries_total", "retries", "Retried attempts"),
+                ("response_bytes_total", "bytes", "Response body bytes")):
+            metric(name, "counter", help_text, [
+                ("", labels(method=item["method"], endpoint=item["endpoint"]),
+                 item[field]) for item in endpoints])
+        samples = []
+        for item in endpoints:
+            for bound, count in item["latency"]["buckets"].items():
+                samples.append(("_bucket", labels(
+                    method=item["method"], endpoint=item["endpoint"],
+                    le=bound), count))
+            endpoint_labels = labels(
+                method=item["method"], endpoint=item["endpoint"])
+            samples.append(("_sum", endpoint_labels, item["latency"]["sum"]))
+            samples.append(("_count", endpoint_labels, item["count"]))
+        metric("request_duration_seconds", "histogram",
+               "Insight API request latency", samples)
+        metric("phase_seconds_total", "counter", "Time spent in sync phases", [
+            ("", labels(phase=name), stats["seconds"])
+            for name, stats in summary["phases"].items()])
+        metric("phase_runs_total", "counter", "Sync phase runs", [
+            ("", labels(phase=name), stats["count"])
+            for name, stats in summary["phases"].items()])
+        if "cache" in summary:
+            namespaces = [
+                (namespace, stats) for namespace, stats
+                in summary["cache"].items() if namespace != "total"]
+            for name, field, help_text in (
+                    ("cache_hits_total", "hits", "Cache hits"),
+                    ("cache_misses_total", "misses", "Cache misses")):
+                metric(name, "counter", help_text, [
+                    ("", labels(namespace=namespace), stats[field])
+                    for namespace, stats in namespaces])
+        return "\n".join(lines) + "\n"
+
+
+class InsightTransport:
+    # Идемпотентные методы можно безопасно повторять
+    IDEMPOTENT_METHODS = ("get", "head", "put", "delete")
+    RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+    def __init__(
+        self, auth, headers=None, pool_size=10, timeout=(10, 120),
+        max_retries=3, backoff_factor=0.5, backoff_max=30,
+        compress_requests=False, compress_min_size=1024, metrics=None,
+        request_rate=None
+    ):
+        self.timeout = timeout
+        self.metrics = metrics
+        # Общий лимит запросов в секунду на все потоки и схемы клиента
+        self.limiter = RateLimiter(request_rate) if request_rate else None
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.backoff_max = backoff_max
+        # Сжатие тела запроса выключено по умолчанию:
+        # не каждый Tomcat перед JIRA понимает Content-Encoding у запроса
+        self.compress_requests = compress_requests
+        self.compress_min_size = compress_min_size
+        self.session = requests.Session()
+        self.session.auth = auth
+        self.session.headers.update(headers or {})
+        self.session.headers.update({
+            "Accept-Encoding": "gzip, deflate",
+            "Connection": "keep-alive",
+        })
+        self.adapter = HTTPAdapter(
+            pool_connections=pool_size, pool_maxsize=pool_size,
+            pool_block=True)
+        self.session.mount("http://", self.adapter)
+        self.session.mount("https://", self.adapter)
+        self.retries = 0
+
+    def __str__(self):
+        return f"InsightTransport: {self.connection_stats()}"
+
+    def request(self, method, url, payload=None, params=None):
+        method = method.lower()
+        headers = {}
+        data = None
+        if payload is not None:
+            data = json.dumps(payload).encode("utf-8")
+            headers["Content-Type"] = "application/json"
+            if self.compress_requests and len(data) >= self.compress_min_size:
+                data = gzip.compress(data)
+                headers["Content-Encoding"] = "gzip"
+        retryable = method in self.IDEMPOTENT_METHODS
+        attempt = 0
+        started = time.monotonic()
+        while True:
+            if self.limiter is not None:
+                self.limiter.acquire()
+            try:
+                response = self.session.request(
+                    method, url, data=data, params=params,
+                    headers=headers, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as error:
+                if not retryable or attempt >= self.max_retries:
+                    if self.metrics is not None:
+                        self.metrics.observe_request(
+                            method, url, None, time.monotonic() - started,
+                            retries=attempt, error=error)
+                    raise
+                delay = self.get_backoff(attempt)
+                logging.warning(
+                    f"{method.upper()} {url}: {error}, "
+                    f"повтор через {delay:.2f} с")
+            else:
+                if (response.status_code not in self.RETRY_STATUSES
+                        or attempt >= self.max_retries
+                        or not (retryable or response.status_code == 429)):
+                    if self.metrics is not None:
+                        self.metrics.observe_request(
+                            method, url, response.status_code,
+                            time.monotonic() - started, len(response.content),
+                            attempt)
+                    return response
+                delay = self.get_backoff(
+                    attempt, response.headers.get("Retry-After"))
+                logging.warning(
+                    f"{method.upper()} {url}: HTTP {response.status_code}, "
+                    f"повтор через {delay:.2f} с")
+                response.close()
+            attempt += 1
+            self.retries += 1
+            time.sleep(delay)
+
+    def get_backoff(self, attempt, retry_after=None):
+        if retry_after:
+            try:
+                delay = float(retry_after)
+            except ValueError:
+                try:
+                    retry_date = parsedate_to_datetime(retry_after)
+                except (TypeError, ValueError):
+                    retry_date = None
+                delay = (
+                    retry_date.timestamp() - time.time() if retry_date else 0)
+            if delay > 0:
+                return min(delay, self.backoff_max)
+        # Экспоненциальная задержка с полным джиттером
+        return random.uniform(
+            0, min(self.backoff_max, self.backoff_factor * 2 ** attempt))
+
+    def connection_stats(self):
+        opened = requests_sent = 0
+        pools = self.adapter.poolmanager.pools
+        for pool_key in pools.keys():
+            pool = pools.get(pool_key)
+            if pool is None:
+                continue
+            opened += pool.num_connections
+            requests_sent += pool.num_requests
+        return {
+            "requests": requests_sent,
+            "connections_opened": opened,
+            "connections_reused": max(requests_sent - opened, 0),
+            "retries": self.retries,
+        }
+
+    def close(self):
+        self.session.close()
+
+
+class InsightCache:
+    # Пространство имён: (максимум записей, TTL в секундах или None)
+    DEFAULT_LIMITS = {
+        "object": (100000, 3600),
+        "object_types": (1000, None),
+        "attributes": (10000, None),
+        "metadata": (10000, None),
+        "iql": (1000, 300),
+        "object_attribute": (100000, 300),
+        # id объектов, которых не оказалось на сервере (битые ссылки)
+        "missing_object": (100000, 300),
+    }
+
+    def __init__(self, limits=None):
+        self.limits = dict(self.DEFAULT_LIMITS, **(limits or {}))
+        self.lock = threading.RLock()
+        self.entries = {}
+        self.stats = {}
+        for namespace in self.limits:
+            self.add_namespace(namespace)
+
+    def __str__(self):
+        return f"InsightCache: {self.get_stats()['total']}"
+
+    def add_namespace(self, namespace):
+        self.entries[namespace] = OrderedDict()
+        self.stats[namespace] = {
+            "hits": 0, "misses": 0, "evictions": 0, "expired": 0}
+
+    def get(self, namespace, key, default=None):
+        with self.lock:
+            entries = self.entries.get(namespace)
+            entry = entries.get(key) if entries is not None else None
+            if entry is None:
+                if entries is not None:
+                    self.stats[namespace]["misses"] += 1
+                return default
+            expires, value = entry
+            if expires is not None and expires < time.monotonic():
+                del entries[key]
+                self.stats[namespace]["expired"] += 1
+                self.stats[namespace]["misses"] += 1
+                return default
+            entries.move_to_end(key)
+            self.stats[namespace]["hits"] += 1
+            return value
+
+    def set(self, namespace, key, value, ttl=None):
+        with self.lock:
+            if namespace not in self.entries:
+                self.limits.setdefault(namespace, (10000, None))
+                self.add_namespace(namespace)
+            max_size, default_ttl = self.limits[namespace]
+            ttl = default_ttl if ttl is None else ttl
+            expires = time.monotonic() + ttl if ttl is not None else None
+            entries = self.entries[namespace]
+            entries[key] = (expires, value)
+            entries.move_to_end(key)
+            while len(entries) > max_size:
+                entries.popitem(last=False)
+                self.stats[namespace]["evictions"] += 1
+
+    def invalidate(self, namespace, key=None):
+        with self.lock:
+            entries = self.entries.get(namespace)
+            if entries is None:
+                return
+            if key is None:
+                entries.clear()
+            else:
+                entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            for entries in self.entries.values():
+                entries.clear()
+
+    def get_stats(self):
+        with self.lock:
+            result = {}
+            total = {"size": 0, "hits": 0, "misses": 0, "evictions": 0,
+                     "expired": 0}
+            for namespace, stats in self.stats.items():
+                result[namespace] = dict(
+                    stats, size=len(self.entries[namespace]))
+                for name, value in result[namespace].items():
+                    total[name] += value
+            requests_count = total["hits"] + total["misses"]
+            total["hit_rate"] = (
+                total["hits"] / requests_count if requests_count else 0.0)
+            result["total"] = total
+            return result
+
+
+class MetadataSnapshot:
+    # Версия формата файла, при несовпадении снимок перестраивается
+    VERSION = 1
+
+    def __init__(self, path, jira_url):
+        self.path = path
+        self.jira_url = jira_url
+        self.lock = threading.Lock()
+        self.data = self.read()
+
+    def __str__(self):
+        return f"MetadataSnapshot: {self.path}"
+
+    def read(self):
+        empty = {
+            "version": self.VERSION, "jira_url": self.jira_url, "schemas": {}}
+        try:
+            with open(self.path, encoding="utf-8") as snapshot_file:
+                data = json.load(snapshot_file)
+        except (OSError, ValueError):
+            return empty
+        if (data.get("version") != self.VERSION
+                or data.get("jira_url") != self.jira_url):
+            logging.info(f"Снимок метаданных {self.path} устарел")
+            return empty
+        return data
+
+    def get_schema(self, schema_json):
+        # Снимок схемы годен, пока не изменилась отметка updated
+        with self.lock:
+            entry = self.data["schemas"].get(str(schema_json["id"]))
+        updated = schema_json.get("updated")
+        if entry is None or updated is None or entry["updated"] != updated:
+            return None
+        return entry
+
+    def put_schema(self, schema_json, object_types_json, attributes_json):
+        with self.lock:
+            self.data["schemas"][str(schema_json["id"])] = {
+                "updated": schema_json.get("updated"),
+                "schema": schema_json,
+                "object_types": object_types_json,
+                "attributes": attributes_json,
+            }
+            self.write()
+
+    def write(self):
+        # Пишем во временный файл и подменяем, чтобы не оставить битый снимок
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as snapshot_file:
+            json.dump(self.data, snapshot_file, ensure_ascii=False)
+        os.replace(temp_path, self.path)
+
+
+class ObjectTypeSnapshot:
+    VERSION = 1
+
+    def __init__(self, path, object_type_id):
+        self.path = path
+        self.object_type_id = object_type_id
+        self.watermark = None
+        self.last_full_sync = None
+        self.objects = {}
+        self.read()
+
+    def __str__(self):
+        return f"ObjectTypeSnapshot: {self.path} ({len(self.objects)})"
+
+    def read(self):
+        try:
+            with gzip.open(self.path, "rt", encoding="utf-8") as snapshot_file:
+                data = json.load(snapshot_file)
+        except (OSError, ValueError):
+            return
+        if (data.get("version") != self.VERSION
+                or data.get("object_type_id") != self.object_type_id):
+            return
+        self.watermark = data["watermark"]
+        self.last_full_sync = data["last_full_sync"]
+        self.objects = {
+            object_json["id"]: object_json for object_json in data["objects"]}
+
+    def write(self):
+        data = {
+            "version": self.VERSION,
+            "object_type_id": self.object_type_id,
+            "watermark": self.watermark,
+            "last_full_sync": self.last_full_sync,
+            "objects": list(self.objects.values()),
+        }
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        with gzip.open(temp_path, "wt", encoding="utf-8") as snapshot_file:
+            json.dump(data, snapshot_file, ensure_ascii=False)
+        os.replace(temp_path, self.path)
+
+
+class SchemaSnapshot:
+    # Снимок всех объектов схемы: index.json и файл <id типа>.jsonl.gz на
+    # каждый тип. Файл типа - цепочка gzip-блоков JSONL, смещения блоков
+    # лежат в индексе: при загрузке файл отображается в память через mmap
+    # и распаковывается поблочно, а gzip -dc отдаёт обычный JSONL
+    VERSION = 1
+    INDEX_FILE = "index.json"
+
+    def __init__(self, path):
+        self.path = path
+        self.index = None
+        self.offsets = {}
+        # Новый снимок пишется во временные файлы рядом с прошлым и
+        # заменяет его только в finish: сбой обхода не портит прошлый снимок
+        self.temp_suffix = f".{os.getpid()}.tmp"
+
+    def __str__(self):
+        return f"SchemaSnapshot: {self.path}"
+
+    def temp_path(self, entry):
+        return os.path.join(self.path, entry["file"] + self.temp_suffix)
+
+    def begin(self, jira_url, schema_json, object_types_json, attributes_json,
+              block_size=1000):
+        os.makedirs(self.path, exist_ok=True)
+        self.index = {
+            "version": self.VERSION,
+            "jira_url": jira_url,
+            "created": time.time(),
+            "block_size": block_size,
+            "schema": schema_json,
+            "object_types_json": object_types_json,
+            "attributes": attributes_json,
+            "object_types": {},
+        }
+        for object_type_json in object_types_json:
+            entry = {
+                "name": object_type_json["name"],
+                "file": f"{object_type_json['id']}.jsonl.gz",
+                "objects": 0,
+                "blocks": [],
+            }
+            self.index["object_types"][str(object_type_json["id"])] = entry
+            open(self.temp_path(entry), "wb").close()
+            self.offsets[object_type_json["id"]] = 0
+
+    @staticmethod
+    def encode_blocks(objects_json, block_size):
+        # Сжатие выполняется в потоках обхода, запись - в одном потоке
+        blocks = []
+        for start in range(0, len(objects_json), block_size):
+            chunk = objects_json[start:start + block_size]
+            data = "\n".join(
+                json.dumps(object_json, ensure_ascii=False)
+                for object_json in chunk) + "\n"
+            blocks.append((gzip.compress(data.encode("utf-8")), len(chunk)))
+        return blocks
+
+    def write_blocks(self, object_type_id, blocks):
+        entry = self.index["object_types"][str(object_type_id)]
+        with open(self.temp_path(entry), "ab") as type_file:
+            for data, count in blocks:
+                type_file.write(data)
+                entry["blocks"].append(
+                    [self.offsets[object_type_id], len(data), count])
+                self.offsets[object_type_id] += len(data)
+                entry["objects"] += count
+
+    def finish(self):
+        # Индекс пишется последним: без него снимок считается незавершённым.
+        # Прошлый индекс удаляется до замены файлов типов, чтобы прерванная
+        # замена не оставила индекс со смещениями в чужих файлах
+        index_path = os.path.join(self.path, self.INDEX_FILE)
+        if os.path.exists(index_path):
+            os.remove(index_path)
+        for entry in self.index["object_types"].values():
+            os.replace(
+                self.temp_path(entry), os.path.join(self.path, entry["file"]))
+        temp_path = index_path + self.temp_suffix
+        with open(temp_path, "w", encoding="utf-8") as index_file:
+            json.dump(self.index, index_file, ensure_ascii=False)
+        os.replace(temp_path, index_path)
+
+    def abort(self):
+        # Прерванный обход: удаляем временные файлы, прошлый снимок остаётся
+        for entry in self.index["object_types"].values():
+            try:
+                os.remove(self.temp_path(entry))
+            except FileNotFoundError:
+                pass
+        self.index = None
+
+    def read_index(self):
+        if self.index is None:
+            with open(os.path.join(self.path, self.INDEX_FILE),
+                      encoding="utf-8") as index_file:
+                index = json.load(index_file)
+            if index.get("version") != self.VERSION:
+                raise ValueError(f'Incorect value {self.path}')
+            self.index = index
+        return self.index
+
+    def iter_json(self, object_type_id):
+        entry = self.read_index()["object_types"].get(str(object_type_id))
+        if entry is None or not entry["blocks"]:
+            return
+        with open(os.path.join(self.path, entry["file"]), "rb") as type_file:
+            with mmap.mmap(
+                    type_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                for offset, length, _ in entry["blocks"]:
+                    block = zlib.decompress(
+                        mapped[offset:offset + length], 16 + zlib.MAX_WBITS)
+                    for line in block.splitlines():
+                        yield json.loads(line)
+
+    def open_schema(self, insight, load_objects=True):
+        # Схема без обращения к серверу: метаданные и объекты из снимка
+        index = self.read_index()
+        schema_json = index["schema"]
+        schemas = insight.cache.get("metadata", "schemas") or []
+        if schema_json["name"] not in [item["name"] for item in schemas]:
+            insight.cache.set("metadata", "schemas", schemas + [schema_json])
+        # Уже открытую схему и её типы с загруженными объектами не подменяем
+        with insight.metadata_lock:
+            schema = insight.object_schemas.get(schema_json["id"])
+            if schema is None:
+                schema = InsightSchema(
+                    insight, schema_json["name"], load_metadata=False)
+            if insight.cache.get("object_types", schema.id) is None:
+                schema.set_metadata(
+                    index["object_types_json"], index["attributes"])
+        if load_objects:
+            schema.load_snapshot(self)
+        return schema
 
 
 class Insight:
-    def __init__(self, jira_url, login, password):
+    def __init__(
+        self, jira_url, login, password, page_workers=4, page_retries=2,
+        reference_batch_size=200, cache=None, metadata_path=None,
+        write_workers=8, write_rate=None, keep_object_json=True,
+        metrics=None, **transport_options
+    ):
         if re.match("^.*://", jira_url):
             self.jira_url = jira_url.rstrip("/")
         else:
             self.jira_url = "http://{}".format(jira_url.rstrip("/"))
-        self.insight_api_url = f"{jira_url}/rest/insight/1.0"
-        self._schemaslist = None
+        self.insight_api_url = f"{self.jira_url}/rest/insight/1.0"
         self.headers = {"Accept": "application/json", "Authorization": "Basic"}
         self.auth = (login, password)
-        self.session = requests.Session()
+        # Счётчики запросов, задержек и этапов синхронизации
+        self.metrics = metrics if metrics is not None else InsightMetrics()
+        self.transport = InsightTransport(
+            self.auth, self.headers, metrics=self.metrics, **transport_options)
+        self.session = self.transport.session
+        # Сколько страниц IQL качать параллельно и сколько раз повторять
+        # упавшую страницу
+        self.page_workers = page_workers
+        self.page_retries = page_retries
         self.object_schemas = {}
+        # Одна блокировка на все ленивые загрузки метаданных и реестр схем:
+        # загрузка типов открывает схемы, а открытие схемы грузит типы,
+        # отдельные блокировки могли бы взаимно заблокироваться
+        self.metadata_lock = threading.RLock()
+        # Общий кеш сессии: объекты (identity map), метаданные и IQL.
+        # Можно передать свой объект с тем же интерфейсом
+        self.cache = cache if cache is not None else InsightCache()
+        if self.metrics.cache is None:
+            self.metrics.cache = self.cache
+        self.reference_batch_size = reference_batch_size
+        # Параллельная запись: число потоков и общий лимит запросов в секунду
+        self.write_workers = write_workers
+        self.write_limiter = RateLimiter(write_rate) if write_rate else None
+        self.local = threading.local()
+        # False - объекты не хранят исходный JSON, только разобранные значения
+        self.keep_object_json = keep_object_json
+        # Снимок метаданных схем на диске для быстрого старта
+        self.metadata_snapshot = None
+        if metadata_path:
+            self.metadata_snapshot = MetadataSnapshot(
+                metadata_path, self.jira_url)
 
     def __str__(self):
         return f"Insight: {self.jira_url}"
 
     @property
     def schemaslist(self):
-        if self._schemaslist is None:
-            self._schemaslist = self.get_schemas()
-        return self._schemaslist
+        schemaslist = self.cache.get("metadata", "schemas")
+        if schemaslist is None:
+            with self.metadata_lock:
+                schemaslist = self.cache.get("metadata", "schemas")
+                if schemaslist is None:
+                    schemaslist = self.get_schemas()
+                    self.cache.set("metadata", "schemas", schemaslist)
+        return schemaslist
+
+    def get_schema(self, object_schema_id):
+        # Схема по id: уже открытая или открывается по списку схем.
+        # Типы и объекты находят свою схему здесь, а не берут первую
+        object_schema = self.object_schemas.get(object_schema_id)
+        if object_schema is not None:
+            return object_schema
+        with self.metadata_lock:
+            object_schema = self.object_schemas.get(object_schema_id)
+            if object_schema is None:
+                names = [
+                    schema_json["name"] for schema_json in self.schemaslist
+                    if schema_json["id"] == object_schema_id]
+                if not names:
+                    raise ValueError(f'Incorect value {object_schema_id}')
+                object_schema = InsightSchema(self, names[0])
+            return object_schema
 
     def get_schemas(self):
         api_path = "/objectschema/list"
@@ -38,38 +864,540 @@ class Insight:
         return result
 
     def do_api_request(self, path, method="get", json=None, params=None):
-        if method == "get":
-            request = requests.get(
-                self.insight_api_url + path,
-                headers=self.headers, auth=self.auth, params=params)
-            request.raise_for_status()
-            return request.json()
-        if method == "post":
-            request = requests.post(
-                self.insight_api_url + path,
-                headers=self.headers, auth=self.auth, json=json, params=params
-            )
-            request.raise_for_status()
-            return request.json()
-        if method == "put":
-            request = requests.put(
-                self.insight_api_url + path,
-                headers=self.headers, auth=self.auth, json=json, params=params
-            )
-            request.raise_for_status()
-            return request.json()
+        if method not in ("get", "post", "put", "head", "delete"):
+            raise NotImplementedError
+        request = self.transport.request(
+            method, self.insight_api_url + path, payload=json, params=params)
         if method == "head":
-            request = requests.head(
-                self.insight_api_url + path,
-                headers=self.headers, auth=self.auth, params=params
-            )
-            request.raise_for_status()
-            return request.json()
-        raise NotImplementedError
+            # У HEAD нет тела, отдаём сам ответ
+            return request
+        self.local.last_status = request.status_code
+        request.raise_for_status()
+        if not request.content:
+            return None
+        return request.json()
+
+    def connection_stats(self):
+        return self.transport.connection_stats()
+
+    def cache_stats(self):
+        return self.cache.get_stats()
+
+    def metrics_summary(self):
+        return self.metrics.summary()
+
+    def run_bulk(self, operation, items: dict, workers=None, rate=None):
+        # Выполняет operation(value) для каждого элемента items в пуле потоков.
+        # Ошибки не прерывают выполнение, а попадают в WriteResult
+        limiter = RateLimiter(rate) if rate else self.write_limiter
+
+        def run_one(key, value):
+            if limiter is not None:
+                limiter.acquire()
+            self.local.last_status = None
+            started = time.monotonic()
+            try:
+                result = operation(value)
+            except requests.HTTPError as error:
+                logging.error(f"Запись {key} не выполнена: {error}")
+                return WriteResult(
+                    key, False, error.response.status_code, str(error),
+                    time.monotonic() - started)
+            except Exception as error:
+                logging.error(f"Запись {key} не выполнена: {error}")
+                return WriteResult(
+                    key, False, self.local.last_status, str(error),
+                    time.monotonic() - started)
+            return WriteResult(
+                key, True, self.local.last_status, None,
+                time.monotonic() - started, result)
+
+        workers = workers or self.write_workers
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            results = list(executor.map(
+                lambda item: run_one(*item), items.items()))
+        failed = len([result for result in results if not result.success])
+        logging.info(
+            f"Выполнено {len(results) - failed} из {len(results)} записей")
+        return results
+
+    def sync_schemas(self, mixers, workers=None, **sync_options):
+        # Несколько Mixer (обычно по разным схемам) синхронизируются
+        # одновременно и делят пул соединений, кеш и общий лимит запросов.
+        # Ошибка одной синхронизации не прерывает остальные: вместо
+        # результата в списке будет исключение
+        def run(mixer):
+            with self.metrics.phase(f"sync {mixer.target.name}"):
+                return mixer.sync(**sync_options)
+
+        results = []
+        with ThreadPoolExecutor(
+                max_workers=max(1, workers or len(mixers))) as executor:
+            futures = [executor.submit(run, mixer) for mixer in mixers]
+            for mixer, future in zip(mixers, futures):
+                try:
+                    results.append(future.result())
+                except Exception as error:
+                    logging.error(f"{mixer} не выполнен: {error!r}")
+                    results.append(error)
+        return results
+
+    def register_object(self, insight_object):
+        self.cache.set("object", insight_object.id, insight_object)
+        self.cache.invalidate("missing_object", insight_object.id)
+
+    def is_missing_object(self, object_id):
+        return self.cache.get("missing_object", object_id) is not None
+
+    def split_cached_objects(self, object_ids):
+        # Объекты из кеша и id, которые нужно загрузить. Id, уже не
+        # найденные на сервере, не запрашиваем до истечения TTL
+        result = {}
+        missing = []
+        for object_id in dict.fromkeys(object_ids):
+            insight_object = self.cache.get("object", object_id)
+            if insight_object is not None:
+                result[object_id] = insight_object
+            elif not self.is_missing_object(object_id):
+                missing.append(object_id)
+        return result, missing
+
+    def remember_missing_objects(self, object_ids, result):
+        for object_id in object_ids:
+            if object_id not in result:
+                self.cache.set("missing_object", object_id, True)
+
+    def forget_object(self, object_id):
+        self.cache.invalidate("object", object_id)
+
+    def invalidate_searches(self):
+        # Любая запись делает сохранённые результаты IQL недостоверными
+        self.cache.invalidate("iql")
+
+    def get_object(self, object_id):
+        insight_object = self.cache.get("object", object_id)
+        if insight_object is None:
+            insight_object = InsightObject(self, object_id)
+            self.register_object(insight_object)
+        return insight_object
+
+    def get_objects(self, object_ids, object_schema_id):
+        # Объекты из кеша, недостающие - пачками через IQL
+        result, missing = self.split_cached_objects(object_ids)
+        if not missing:
+            return result
+        object_schema = self.get_schema(object_schema_id)
+        for start in range(0, len(missing), self.reference_batch_size):
+            batch = missing[start:start + self.reference_batch_size]
+            iql = f"objectId IN ({', '.join(map(str, batch))})"
+            for insight_object in object_schema.iter_iql(iql):
+                self.register_object(insight_object)
+                result[insight_object.id] = insight_object
+        self.remember_missing_objects(missing, result)
+        return result
+
+    def resolve_references(self, insight_objects, attribute_ids=None):
+        # Собираем id всех ссылок в наборе объектов и загружаем их разом
+        result = {}
+        for object_schema_id, object_ids in self.collect_reference_ids(
+                insight_objects, attribute_ids).items():
+            result.update(self.get_objects(object_ids, object_schema_id))
+        return result
+
+    @staticmethod
+    def collect_reference_ids(insight_objects, attribute_ids=None):
+        # {id схемы: [id объектов]} по ссылочным атрибутам набора объектов
+        ids_by_schema = {}
+        for insight_object in insight_objects:
+            object_schema = insight_object.object_schema
+            definitions = object_schema.object_type_attributes
+            for attribute_id, values_json in insight_object.iter_values():
+                if (attribute_ids is not None
+                        and attribute_id not in attribute_ids
+                        or definitions[attribute_id].attribute_type != "Object"):
+                    continue
+                for value_json in values_json:
+                    referenced_object = value_json["referencedObject"]
+                    object_schema_id = referenced_object.get(
+                        "objectType", {}).get("objectSchemaId", object_schema.id)
+                    ids_by_schema.setdefault(object_schema_id, []).append(
+                        referenced_object["id"])
+        return ids_by_schema
+
+
+class AsyncInsight(Insight):
+    # Асинхронный клиент поверх aiohttp. Модели, кеши и индексы общие
+    # с Insight: асинхронные методы загружают JSON и кладут результат туда
+    # же, где его ищут синхронные свойства
+    def __init__(
+        self, jira_url, login, password, max_concurrency=1000,
+        request_timeout=120, **options
+    ):
+        if aiohttp is None:
+            raise ImportError("Для AsyncInsight требуется aiohttp")
+        super().__init__(jira_url, login, password, **options)
+        self.max_concurrency = max_concurrency
+        self.request_timeout = request_timeout
+        self.semaphore = None
+        self.async_session = None
+
+    def __str__(self):
+        return f"AsyncInsight: {self.jira_url}"
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        if self.async_session is not None:
+            await self.async_session.close()
+            self.async_session = None
+        self.transport.close()
+
+    def get_async_session(self):
+        # Сессия создаётся внутри работающего цикла событий
+        if self.async_session is None:
+            self.semaphore = asyncio.Semaphore(self.max_concurrency)
+            connector = aiohttp.TCPConnector(limit=self.max_concurrency)
+            self.async_session = aiohttp.ClientSession(
+                connector=connector,
+                auth=aiohttp.BasicAuth(*self.auth),
+                headers={"Accept": "application/json"})
+        return self.async_session
+
+    async def do_api_request_async(
+        self, path, method="get", json=None, params=None, timeout=None
+    ):
+        if method not in ("get", "post", "put", "head", "delete"):
+            raise NotImplementedError
+        session = self.get_async_session()
+        transport = self.transport
+        retryable = method in transport.IDEMPOTENT_METHODS
+        client_timeout = aiohttp.ClientTimeout(
+            total=timeout or self.request_timeout)
+        url = self.insight_api_url + path
+        attempt = 0
+        started = time.monotonic()
+        while True:
+            if transport.limiter is not None:
+                await transport.limiter.acquire_async()
+            async with self.semaphore:
+                try:
+                    async with session.request(
+                            method.upper(), url, json=json, params=params,
+                            timeout=client_timeout) as response:
+                        if (response.status not in transport.RETRY_STATUSES
+                                or attempt >= transport.max_retries
+                                or not (retryable or response.status == 429)):
+                            body = await response.read()
+                            ASYNC_LAST_STATUS.set(response.status)
+                            self.metrics.observe_request(
+                                method, url, response.status,
+                                time.monotonic() - started, len(body),
+                                attempt)
+                            if method == "head":
+                                return response.status
+                            response.raise_for_status()
+                            return await response.json(content_type=None)
+                        delay = transport.get_backoff(
+                            attempt, response.headers.get("Retry-After"))
+                        logging.warning(
+                            f"{method.upper()} {url}: HTTP {response.status}, "
+                            f"повтор через {delay:.2f} с")
+                except (aiohttp.ClientConnectionError,
+                        asyncio.TimeoutError) as error:
+                    if not retryable or attempt >= transport.max_retries:
+                        self.metrics.observe_request(
+                            method, url, None, time.monotonic() - started,
+                            retries=attempt, error=error)
+                        raise
+                    delay = transport.get_backoff(attempt)
+                    logging.warning(
+                        f"{method.upper()} {url}: {error!r}, "
+                        f"повтор через {delay:.2f} с")
+            attempt += 1
+            transport.retries += 1
+            await asyncio.sleep(delay)
+
+    async def get_schema_async(self, schemaname):
+        if self.cache.get("metadata", "schemas") is None:
+            response = await self.do_api_request_async("/objectschema/list")
+            self.cache.set(
+                "metadata", "schemas", response.get("objectschemas", {}))
+        schema = InsightSchema(self, schemaname, load_metadata=False)
+        if self.cache.get("object_types", schema.id) is not None:
+            return schema
+        entry = None
+        snapshot = self.metadata_snapshot
+        if snapshot is not None:
+            entry = snapshot.get_schema(schema.schema)
+        if entry is not None:
+            object_types_json = entry["object_types"]
+            attributes_json = entry["attributes"]
+        else:
+            object_types_json, attributes_json = await asyncio.gather(
+                self.do_api_request_async(
+                    f"/objectschema/{schema.id}/objecttypes/flat"),
+                self.do_api_request_async(
+                    f"/objectschema/{schema.id}/attributes"))
+            if snapshot is not None:
+                # Запись файла снимка не должна блокировать цикл событий
+                await asyncio.get_running_loop().run_in_executor(
+                    None, snapshot.put_schema, schema.schema,
+                    object_types_json, attributes_json)
+        if self.cache.get("object_types", schema.id) is None:
+            schema.set_metadata(object_types_json, attributes_json)
+        return schema
+
+    async def get_schema_by_id_async(self, object_schema_id):
+        object_schema = self.object_schemas.get(object_schema_id)
+        if object_schema is not None:
+            return object_schema
+        if self.cache.get("metadata", "schemas") is None:
+            response = await self.do_api_request_async("/objectschema/list")
+            self.cache.set(
+                "metadata", "schemas", response.get("objectschemas", {}))
+        names = [
+            schema_json["name"] for schema_json in self.schemaslist
+            if schema_json["id"] == object_schema_id]
+        if not names:
+            raise ValueError(f'Incorect value {object_schema_id}')
+        return await self.get_schema_async(names[0])
+
+    async def get_object_type_attributes_async(self, object_type):
+        cache_key = ("objecttype", object_type.id)
+        object_type_attributes = self.cache.get("attributes", cache_key)
+        if object_type_attributes is None:
+            object_type_attributes = InsightSchema.build_object_type_attributes(
+                object_type, await self.do_api_request_async(
+                    f"/objecttype/{object_type.id}/attributes"))
+            self.cache.set("attributes", cache_key, object_type_attributes)
+        return object_type_attributes
+
+    async def get_iql_page_async(self, schema, params, page_number):
+        params = dict(params, page=page_number)
+        attempt = 0
+        while True:
+            try:
+                page = await self.do_api_request_async(
+                    "/iql/objects", params=params)
+                return page["objectEntries"]
+            except (aiohttp.ClientError, asyncio.TimeoutError) as error:
+                if attempt >= self.page_retries:
+                    raise
+                attempt += 1
+                logging.warning(
+                    f"Страница {page_number} не загружена: {error!r}, "
+                    f"попытка {attempt} из {self.page_retries}")
+
+    async def iter_iql_json_async(self, schema, iql=None):
+        # Как InsightSchema.iter_iql_json: следующая страница загружается,
+        # пока вызывающий разбирает текущую
+        params = schema.get_iql_params(iql)
+        first_page = await self.do_api_request_async(
+            "/iql/objects", params=params)
+        pages_count = first_page["pageSize"]
+        page = first_page["objectEntries"]
+        page_number = 1
+        while page:
+            next_page = None
+            if page_number < pages_count:
+                next_page = asyncio.ensure_future(self.get_iql_page_async(
+                    schema, params, page_number + 1))
+            try:
+                for json_object in page:
+                    yield json_object
+            except GeneratorExit:
+                if next_page is not None:
+                    next_page.cancel()
+                raise
+            page = await next_page if next_page else None
+            page_number += 1
+
+    async def iter_iql_async(self, schema, iql=None):
+        async for json_object in self.iter_iql_json_async(schema, iql):
+            yield InsightObject(self, json_object["id"], json_object)
+
+    async def search_iql_async(self, schema, iql=None):
+        # Все страницы после первой загружаются одновременно
+        params = schema.get_iql_params(iql)
+        first_page = await self.do_api_request_async(
+            "/iql/objects", params=params)
+        pages = [first_page["objectEntries"]]
+        pages += await asyncio.gather(*(
+            self.get_iql_page_async(schema, params, page_number)
+            for page_number in range(2, first_page["pageSize"] + 1)))
+        result = {}
+        for page in pages:
+            for json_object in page:
+                insight_object = InsightObject(
+                    self, json_object["id"], json_object)
+                result[insight_object.id] = insight_object
+                self.register_object(insight_object)
+        return result
+
+    async def load_objects_async(self, object_type):
+        object_type._objects = await self.search_iql_async(
+            object_type.schema, f'objectType = "{object_type.name}"')
+        object_type.build_indexes()
+        return object_type._objects
+
+    async def get_object_async(self, object_id):
+        insight_object = self.cache.get("object", object_id)
+        if insight_object is None:
+            insight_object = InsightObject(
+                self, object_id,
+                await self.do_api_request_async(f"/object/{object_id}"))
+            self.register_object(insight_object)
+        return insight_object
+
+    async def get_objects_async(self, object_ids, object_schema_id):
+        # Как Insight.get_objects: пачки objectId IN загружаются одновременно
+        result, missing = self.split_cached_objects(object_ids)
+        if not missing:
+            return result
+        object_schema = await self.get_schema_by_id_async(object_schema_id)
+
+        async def load_batch(batch):
+            iql = f"objectId IN ({', '.join(map(str, batch))})"
+            return [
+                insight_object async for insight_object
+                in self.iter_iql_async(object_schema, iql)]
+
+        batches = [
+            missing[start:start + self.reference_batch_size]
+            for start in range(0, len(missing), self.reference_batch_size)]
+        for insight_objects in await asyncio.gather(*map(load_batch, batches)):
+            for insight_object in insight_objects:
+                self.register_object(insight_object)
+                result[insight_object.id] = insight_object
+        self.remember_missing_objects(missing, result)
+        return result
+
+    async def resolve_references_async(self, insight_objects,
+                                       attribute_ids=None):
+        # После загрузки ссылки лежат в кеше и value читает их без запросов
+        ids_by_schema = self.collect_reference_ids(
+            insight_objects, attribute_ids)
+        result = {}
+        for objects in await asyncio.gather(*(
+                self.get_objects_async(object_ids, object_schema_id)
+                for object_schema_id, object_ids in ids_by_schema.items())):
+            result.update(objects)
+        return result
+
+    async def get_value_async(self, insight_object, name, default=None):
+        # value без блокирующих запросов: ссылки подгружаются асинхронно
+        # сразу для всего загруженного раздела, как в get_referenced_objects
+        attribute = insight_object.get_attribute(name)
+        if attribute is None:
+            return default
+        if attribute.object_type_attribute.attribute_type != "Object":
+            return attribute.value
+        object_ids = attribute.referenced_ids()
+        referenced = {
+            object_id: self.cache.get("object", object_id)
+            for object_id in object_ids}
+        if any(
+                insight_object is None and not self.is_missing_object(object_id)
+                for object_id, insight_object in referenced.items()):
+            object_type = insight_object.object_type
+            scope = [insight_object]
+            if (object_type is not None and object_type._objects
+                    and insight_object.id in object_type._objects):
+                scope = object_type._objects.values()
+            referenced.update(await self.resolve_references_async(
+                scope, {attribute.id}))
+        return [
+            referenced[object_id] for object_id in object_ids
+            if referenced.get(object_id) is not None]
+
+    async def object_exists_async(self, object_id):
+        status = await self.do_api_request_async(
+            f"/object/{object_id}", "head")
+        return status == 200
+
+    async def create_object_async(self, object_type, attributes: dict):
+        response = await self.do_api_request_async(
+            "/object/create", method="post",
+            json=InsightObject.make_request_body(object_type.id, attributes))
+        object_json = response
+        if not InsightObject.is_full_json(response):
+            object_json = await self.do_api_request_async(
+                f"/object/{response['id']}")
+        return object_type.add_created_object(object_json)
+
+    async def update_object_async(self, insight_object, attributes: dict):
+        response = await self.do_api_request_async(
+            f"/object/{insight_object.id}", method="put",
+            json=InsightObject.make_request_body(
+                insight_object.object_type_id, attributes))
+        insight_object.apply_update(response)
+        return response
+
+    async def delete_object_async(self, insight_object):
+        response = await self.do_api_request_async(
+            f"/object/{insight_object.id}", method="delete")
+        insight_object.apply_delete()
+        return response
+
+    async def run_bulk_async(self, operation, items: dict, rate=None):
+        # Одновременность ограничена семафором запросов, частота - лимитом
+        # записи, ошибки собираются в WriteResult как в run_bulk
+        limiter = RateLimiter(rate) if rate else self.write_limiter
+
+        async def run_one(key, value):
+            if limiter is not None:
+                await limiter.acquire_async()
+            ASYNC_LAST_STATUS.set(None)
+            started = time.monotonic()
+            try:
+                result = await operation(value)
+            except aiohttp.ClientResponseError as error:
+                logging.error(f"Запись {key} не выполнена: {error}")
+                return WriteResult(
+                    key, False, error.status, str(error),
+                    time.monotonic() - started)
+            except Exception as error:
+                logging.error(f"Запись {key} не выполнена: {error!r}")
+                return WriteResult(
+                    key, False, ASYNC_LAST_STATUS.get(), repr(error),
+                    time.monotonic() - started)
+            return WriteResult(
+                key, True, ASYNC_LAST_STATUS.get(), None,
+                time.monotonic() - started, result)
+
+        return list(await asyncio.gather(*(
+            run_one(key, value) for key, value in items.items())))
+
+    async def bulk_create_async(self, object_type, objects, rate=None):
+        if not isinstance(objects, dict):
+            objects = dict(enumerate(objects))
+        return await self.run_bulk_async(
+            lambda attributes: self.create_object_async(
+                object_type, attributes), objects, rate)
+
+    async def bulk_update_async(self, object_type, objects: dict, rate=None):
+        async def update_one(item):
+            object_id, attributes = item
+            insight_object = None
+            if object_type._objects is not None:
+                insight_object = object_type._objects.get(object_id)
+            if insight_object is None:
+                insight_object = await self.get_object_async(object_id)
+            return await self.update_object_async(insight_object, attributes)
+
+        return await self.run_bulk_async(
+            update_one, {key: (key, value) for key, value in objects.items()},
+            rate)
 
 
 class InsightSchema:
-    def __init__(self, insight, schemaname):
+    def __init__(self, insight, schemaname, load_metadata=True):
+        # load_metadata=False - не читать снимок метаданных при создании,
+        # метаданные передаст вызывающий (асинхронный клиент, снимок схемы)
         self.insight = insight
         self.schema = [
             i for i in insight.schemaslist if i['name'] == schemaname][0]
@@ -77,23 +1405,89 @@ class InsightSchema:
         self.id = self.schema.get("id", None)
         self.key = self.schema.get("objectSchemaKey", None)
         self.description = self.schema.get("description", None)
-        self._object_types = None
-        self._object_type_attributes = None
-        self.insight.object_schemas[self.id] = self
+        # Общие для всех объектов типа раскладки атрибутов
+        self.layouts = {}
+        self.layouts_lock = threading.Lock()
+        with self.insight.metadata_lock:
+            self.insight.object_schemas[self.id] = self
+            if load_metadata and self.insight.metadata_snapshot is not None:
+                self.load_metadata()
 
     def __str__(self):
         return f"InsightObjectSchema: {self.name} ({self.key})"
 
     @property
     def object_types(self):
-        if self._object_types is None:
-            self._object_types = self.get_object_types()
-        return self._object_types
+        object_types = self.insight.cache.get("object_types", self.id)
+        if object_types is None:
+            # Типы создаются один раз: лишние экземпляры остались бы
+            # без загруженных объектов и обновлений индексов
+            with self.insight.metadata_lock:
+                object_types = self.insight.cache.get("object_types", self.id)
+                if object_types is None:
+                    object_types = self.get_object_types()
+                    self.insight.cache.set(
+                        "object_types", self.id, object_types)
+        return object_types
+
+    def load_metadata(self):
+        # Типы уже в кеше (схему открыли повторно) - не подменяем их,
+        # иначе загруженные объекты останутся у прежних экземпляров типов
+        if self.insight.cache.get("object_types", self.id) is not None:
+            return
+        snapshot = self.insight.metadata_snapshot
+        entry = snapshot.get_schema(self.schema)
+        if entry is None:
+            logging.info(f"Перестраиваю снимок метаданных схемы {self.name}")
+            object_types_json = self.insight.do_api_request(
+                f"/objectschema/{self.id}/objecttypes/flat")
+            attributes_json = self.insight.do_api_request(
+                f"/objectschema/{self.id}/attributes")
+            snapshot.put_schema(self.schema, object_types_json, attributes_json)
+        else:
+            logging.info(f"Метаданные схемы {self.name} взяты из снимка")
+            object_types_json = entry["object_types"]
+            attributes_json = entry["attributes"]
+        self.set_metadata(object_types_json, attributes_json)
+
+    def set_metadata(self, object_types_json, attributes_json):
+        # Кладёт в кеш типы и атрибуты схемы, атрибуты типов берутся
+        # из атрибутов схемы без отдельных запросов
+        object_types = self.build_object_types(object_types_json)
+        self.insight.cache.set("object_types", self.id, object_types)
+        self.insight.cache.set(
+            "attributes", ("objectschema", self.id),
+            self.build_object_type_attributes(self, attributes_json))
+        # Атрибуты схемы содержат тип объекта, раскладываем их по типам
+        attributes_by_type = {}
+        for attribute_json in attributes_json:
+            object_type_id = attribute_json.get("objectType", {}).get("id")
+            if object_type_id is None:
+                return
+            attributes_by_type.setdefault(object_type_id, []).append(
+                attribute_json)
+        for object_type_id, object_type in object_types.items():
+            self.insight.cache.set(
+                "attributes", ("objecttype", object_type_id),
+                self.build_object_type_attributes(
+                    object_type, attributes_by_type.get(object_type_id, [])))
+
+    @staticmethod
+    def build_object_type_attributes(owner, object_type_attributes_json):
+        object_type_attributes = {}
+        for object_type_attribute_json in object_type_attributes_json:
+            object_type_attributes[
+                object_type_attribute_json["id"]
+            ] = InsightObjectTypeAttribute(owner, object_type_attribute_json)
+        return object_type_attributes
 
     def get_object_types(self):
         object_types_json = self.insight.do_api_request(
             f"/objectschema/{self.id}/objecttypes/flat"
         )
+        return self.build_object_types(object_types_json)
+
+    def build_object_types(self, object_types_json):
         object_types = {}
         for object_type in object_types_json:
             object_types[object_type["id"]] = InsightObjectType(
@@ -103,30 +1497,51 @@ class InsightSchema:
 
     @property
     def object_type_attributes(self):
-        if self._object_type_attributes is None:
-            self._object_type_attributes = self.get_object_type_attributes()
-        return self._object_type_attributes
+        cache_key = ("objectschema", self.id)
+        object_type_attributes = self.insight.cache.get(
+            "attributes", cache_key)
+        if object_type_attributes is None:
+            with self.insight.metadata_lock:
+                object_type_attributes = self.insight.cache.get(
+                    "attributes", cache_key)
+                if object_type_attributes is None:
+                    object_type_attributes = self.get_object_type_attributes()
+                    self.insight.cache.set(
+                        "attributes", cache_key, object_type_attributes)
+        return object_type_attributes
 
     def get_object_type_attributes(self):
         object_type_attributes_json = self.insight.do_api_request(
             f"/objectschema/{self.id}/attributes"
         )
-        object_type_attributes = {}
-        for object_type_attribute_json in object_type_attributes_json:
-            object_type_attributes[
-                object_type_attribute_json["id"]
-            ] = InsightObjectTypeAttribute(self, object_type_attribute_json)
-        return object_type_attributes
+        return self.build_object_type_attributes(
+            self, object_type_attributes_json)
 
     def object_exists(self, object_id):
-        return (
-            self.insight.do_api_request(
-                f"/object/{object_id}", "head").status_code
-            == 200
-        )
+        return object_id in self.existing_object_ids([object_id])
 
-    def search_iql(self, iql=None):
-        api_path = "/iql/objects"
+    def existing_object_ids(self, object_ids):
+        # Проверка существования пачками через IQL вместо HEAD на объект,
+        # кеш не используется: нужен ответ сервера на текущий момент
+        object_ids = list(dict.fromkeys(object_ids))
+        batch_size = self.insight.reference_batch_size
+        existing = set()
+        for start in range(0, len(object_ids), batch_size):
+            batch = object_ids[start:start + batch_size]
+            iql = f"objectId IN ({', '.join(map(str, batch))})"
+            existing.update(
+                object_json["id"] for object_json in self.iter_iql_json(iql))
+        return existing
+
+    def get_layout(self, object_type_id):
+        layout = self.layouts.get(object_type_id)
+        if layout is None:
+            with self.layouts_lock:
+                layout = self.layouts.setdefault(
+                    object_type_id, AttributeLayout(self))
+        return layout
+
+    def get_iql_params(self, iql=None):
         params = {
             "objectSchemaId": self.id,
             "resultPerPage": 10000,
@@ -134,84 +1549,445 @@ class InsightSchema:
         }
         if iql is not None:
             params["iql"] = iql
+        return params
+
+    def search_iql(self, iql=None, use_cache=True):
+        cache_key = (self.id, iql)
+        if use_cache:
+            result = self.insight.cache.get("iql", cache_key)
+            if result is not None:
+                return dict(result)
+        api_path = "/iql/objects"
+        params = self.get_iql_params(iql)
         search_request = self.insight.do_api_request(api_path, params=params)
         search_results = search_request
         objects_json: list = search_results["objectEntries"]
         if not objects_json:
-            raise StopIteration
-
-        if search_results["pageSize"] > 1:
-            for page_number in range(2, search_results["pageSize"] + 1):
-                params["page"] = page_number
-                logging.info(
-                    f'Reading page {page_number}'
-                    f'of {search_results["pageSize"]}'
-                )
-                page = self.insight.do_api_request(api_path, params=params)
-                objects_json += page["objectEntries"]
+            if use_cache:
+                self.insight.cache.set("iql", cache_key, {})
+            return {}
+
+        pages_count = search_results["pageSize"]
+        if pages_count > 1:
+            for page in self.get_iql_pages(params, range(2, pages_count + 1)):
+                objects_json += page
         result = {}
         for json_object in objects_json:
             object_to_add = InsightObject(
                 self.insight, json_object["id"], json_object)
 
             result[object_to_add.id] = object_to_add
-            # yield  object_to_add
-        return result
+            self.insight.register_object(object_to_add)
+        if use_cache:
+            self.insight.cache.set("iql", cache_key, result)
+        return dict(result)
+
+    def iter_iql(self, iql=None):
+        for json_object in self.iter_iql_json(iql):
+            yield InsightObject(self.insight, json_object["id"], json_object)
+
+    def iter_iql_json(self, iql=None):
+        # Потоковый поиск: в памяти не больше текущей и следующей страницы,
+        # следующая страница качается, пока вызывающий разбирает текущую
+        params = self.get_iql_params(iql)
+        first_page = self.insight.do_api_request("/iql/objects", params=params)
+        pages_count = first_page["pageSize"]
+        page = first_page["objectEntries"]
+        page_number = 1
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            while page:
+                next_page = None
+                if page_number < pages_count:
+                    next_page = executor.submit(
+                        self.get_iql_page, params, page_number + 1)
+                yield from page
+                page = next_page.result() if next_page else None
+                page_number += 1
+
+    def get_iql_pages(self, params, page_numbers):
+        # Страницы отдаются строго в порядке page_numbers
+        workers = min(self.insight.page_workers, len(page_numbers))
+        if workers <= 1:
+            for page_number in page_numbers:
+                yield self.get_iql_page(params, page_number)
+            return
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            yield from executor.map(
+                lambda page_number: self.get_iql_page(params, page_number),
+                page_numbers)
+
+    def get_iql_page(self, params, page_number):
+        return self.get_iql_page_json(params, page_number)["objectEntries"]
+
+    def get_iql_page_json(self, params, page_number):
+        params = dict(params, page=page_number)
+        attempt = 0
+        while True:
+            logging.info(f"Reading page {page_number} ({params.get('iql')})")
+            try:
+                return self.insight.do_api_request(
+                    "/iql/objects", params=params)
+            except (requests.RequestException, ValueError) as error:
+                if attempt >= self.insight.page_retries:
+                    raise
+                attempt += 1
+                logging.warning(
+                    f"Страница {page_number} не загружена: {error}, "
+                    f"попытка {attempt} из {self.insight.page_retries}")
+
+    def create_references(self, references, workers=None, rate=None):
+        # references: {id типа: [имена]}, объекты создаются параллельно
+        # и сразу попадают в индексы своих типов
+        results = {}
+        for object_type_id, names in references.items():
+            object_type = self.object_types[object_type_id]
+            name_id = object_type.get_id_object_type_attribute(KEY_ATTRIBUTE)
+            logging.info(
+                f"Создаю {len(names)} объектов в разделе {object_type.name}")
+            results[object_type_id] = object_type.bulk_create(
+                {name: {name_id: name} for name in names}, workers, rate)
+        return results
 
     def get_object_type(self, object_type):
         return [type for type in self.object_types.values() if type.name == object_type][0]
 
+    def snapshot(self, path, workers=None, rate=None, block_size=1000):
+        # Полный снимок схемы на диск. Все страницы всех типов качаются
+        # общим пулом под общим лимитом запросов, крупные типы первыми.
+        # Страница сразу сжимается и дописывается в файл своего типа
+        # Без includeObjectCounts сервер не отдаёт objectCount
+        object_types_json = self.insight.do_api_request(
+            f"/objectschema/{self.id}/objecttypes/flat",
+            params={"includeObjectCounts": "true"})
+        attributes_json = self.insight.do_api_request(
+            f"/objectschema/{self.id}/attributes")
+        snapshot = SchemaSnapshot(path)
+        snapshot.begin(
+            self.insight.jira_url, self.schema, object_types_json,
+            attributes_json, block_size)
+        limiter = RateLimiter(rate) if rate else None
+        per_page = self.get_iql_params()["resultPerPage"]
+        object_types_json = sorted(
+            object_types_json,
+            key=lambda object_type_json: object_type_json.get("objectCount", 0),
+            reverse=True)
+
+        def fetch(object_type_id, params, page_number):
+            if limiter is not None:
+                limiter.acquire()
+            page = self.get_iql_page_json(params, page_number)
+            return object_type_id, params, page["pageSize"], \
+                snapshot.encode_blocks(page["objectEntries"], block_size)
+
+        started = time.monotonic()
+        try:
+            self.crawl_snapshot(
+                snapshot, object_types_json, fetch, per_page, workers)
+        except BaseException:
+            snapshot.abort()
+            raise
+        snapshot.finish()
+        objects_count = sum(
+            entry["objects"]
+            for entry in snapshot.index["object_types"].values())
+        logging.info(
+            f"Снимок схемы {self.name}: {len(object_types_json)} типов, "
+            f"{objects_count} объектов за {time.monotonic() - started:.1f} с")
+        return snapshot
+
+    def crawl_snapshot(self, snapshot, object_types_json, fetch, per_page,
+                       workers=None):
+        expected_pages = {}
+        with ThreadPoolExecutor(
+                max_workers=workers or self.insight.page_workers) as executor:
+            pending = set()
+            for object_type_json in object_types_json:
+                object_type_id = object_type_json["id"]
+                params = self.get_iql_params(f"objectTypeId = {object_type_id}")
+                # Число страниц известно заранее по objectCount, поэтому
+                # страницы крупных типов встают в очередь первыми
+                expected_pages[object_type_id] = max(
+                    1, -(-object_type_json.get("objectCount", 0) // per_page))
+                for page_number in range(1, expected_pages[object_type_id] + 1):
+                    pending.add(executor.submit(
+                        fetch, object_type_id, params, page_number))
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    object_type_id, params, pages_count, blocks = \
+                        future.result()
+                    snapshot.write_blocks(object_type_id, blocks)
+                    # Тип вырос после чтения objectCount - дочитываем страницы
+                    for page_number in range(
+                            expected_pages[object_type_id] + 1,
+                            pages_count + 1):
+                        pending.add(executor.submit(
+                            fetch, object_type_id, params, page_number))
+                    expected_pages[object_type_id] = max(
+                        expected_pages[object_type_id], pages_count)
+
+    def load_snapshot(self, snapshot, object_type_names=None):
+        # Заполняет типы объектами из снимка вместо обхода сервера
+        if not isinstance(snapshot, SchemaSnapshot):
+            snapshot = SchemaSnapshot(snapshot)
+        index = snapshot.read_index()
+        if index["schema"]["id"] != self.id:
+            raise ValueError(f'Incorect value {snapshot}')
+        for object_type in self.object_types.values():
+            if str(object_type.id) not in index["object_types"]:
+                continue
+            if object_type_names and object_type.name not in object_type_names:
+                continue
+            object_type.load_objects_json(snapshot.iter_json(object_type.id))
+        return snapshot
+
 class InsightObjectType:
     def __init__(self, insight, object_type_id, object_type_json=None):
         self.insight = insight
         self.id = object_type_id
         logging.info(f"Загружаю Insight тип объекта с ID {self.id}")
+        if not object_type_json:
+            object_type_json = self.insight.cache.get(
+                "metadata", ("objecttype", self.id))
         if not object_type_json:
             object_type_json = self.insight.do_api_request(
                 f"/objecttype/{self.id}")
+            self.insight.cache.set(
+                "metadata", ("objecttype", self.id), object_type_json)
         self.name = object_type_json.get("name", None)
         self.object_schema_id = object_type_json.get("objectSchemaId", None)
-        self.schema = [
-            schema for schema in self.insight.object_schemas.items()][0][1]
-        self._object_type_attributes = None
+        self.object_count = object_type_json.get("objectCount", 0)
+        if self.object_schema_id is not None:
+            self.schema = self.insight.get_schema(self.object_schema_id)
+        else:
+            self.schema = [
+                schema for schema in self.insight.object_schemas.items()][0][1]
+        self._attribute_ids = None
+        self._attribute_ids_source = None
         self._objects = None
+        # Индексы по KEY_ATTRIBUTE (или label) и по objectKey,
+        # индекс по id - сам словарь _objects
+        self._objects_by_name = None
+        self._objects_by_key = None
+        # Сколько раз объект был влит в кеш вместо перечитывания раздела
+        self.refetches_avoided = 0
+        self.index_lock = threading.RLock()
 
     def __str__(self):
         return f"InsightObjectType: {self.name}"
 
     def create_object(self, attributes: dict):
-        attributes_json = []
-        for attribute_id, value in attributes.items():
-            entry = {
-                "objectTypeAttributeId": attribute_id,
-                "objectAttributeValues": [{"value": value}],
-            }
-            attributes_json.append(entry)
-        request_body = {"objectTypeId": self.id, "attributes": attributes_json}
+        request_body = InsightObject.make_request_body(self.id, attributes)
         response = self.insight.do_api_request(
             "/object/create", method="post", json=request_body
         )
-        object_id = response["id"]
-        created_object = InsightObject(self.insight, object_id)
-        self._objects = None
+        object_json = response
+        # Обычно POST уже возвращает объект целиком, повторный GET не нужен
+        if not InsightObject.is_full_json(response):
+            object_json = self.insight.do_api_request(
+                f"/object/{response['id']}")
+        return self.add_created_object(object_json)
+
+    def add_created_object(self, object_json):
+        created_object = InsightObject(
+            self.insight, object_json["id"], object_json)
+        self.index_object(created_object)
+        self.insight.register_object(created_object)
+        self.insight.invalidate_searches()
         return created_object
 
+    def bulk_create(self, objects, workers=None, rate=None):
+        # objects: список словарей атрибутов или {ключ: словарь атрибутов}
+        if not isinstance(objects, dict):
+            objects = dict(enumerate(objects))
+        return self.insight.run_bulk(
+            self.create_object, objects, workers, rate)
+
+    def bulk_update(self, objects: dict, workers=None, rate=None):
+        # objects: {id объекта: {id атрибута: значение}}. Раздел не
+        # загружается ради записи: незагруженные объекты читаются по id
+        loaded = self._objects or {}
+
+        def update_one(item):
+            object_id, attributes = item
+            insight_object = loaded.get(object_id)
+            if insight_object is None:
+                insight_object = self.insight.get_object(object_id)
+            return insight_object.update_object(attributes)
+
+        return self.insight.run_bulk(
+            update_one, {key: (key, value) for key, value in objects.items()},
+            workers, rate)
+
+    def bulk_delete(self, object_ids, workers=None, rate=None):
+        loaded = self._objects or {}
+
+        def delete_one(object_id):
+            insight_object = loaded.get(object_id)
+            if insight_object is None:
+                insight_object = self.insight.get_object(object_id)
+            return insight_object.delete_object()
+
+        return self.insight.run_bulk(
+            delete_one, {object_id: object_id for object_id in object_ids},
+            workers, rate)
+
+    def invalidate(self):
+        # Сбросить кеш объектов, следующее обращение к objects
+        # заново прочитает раздел
+        self._objects = None
+        self._objects_by_name = None
+        self._objects_by_key = None
+
+    def refresh(self):
+        self.invalidate()
+        return self.objects
+
     @property
     def objects(self):
         if self._objects is None:
-            self._objects = self.get_objects()
+            # Раздел загружается один раз, даже если его одновременно
+            # запросили несколько потоков
+            with self.index_lock:
+                if self._objects is None:
+                    self._objects = self.get_objects()
+                    self.build_indexes()
         return self._objects
 
+    @property
+    def objects_by_name(self):
+        self.objects
+        with self.index_lock:
+            return self._objects_by_name
+
+    @property
+    def objects_by_key(self):
+        self.objects
+        with self.index_lock:
+            return self._objects_by_key
+
+    def build_indexes(self):
+        self._objects_by_name = {}
+        self._objects_by_key = {}
+        for insight_object in self._objects.values():
+            self.add_to_indexes(insight_object)
+        duplicates = self.get_duplicate_names()
+        if duplicates:
+            logging.warning(
+                f"В разделе {self.name} неуникальные имена: "
+                f"{', '.join(map(str, duplicates))}")
+
+    def add_to_indexes(self, insight_object):
+        self._objects_by_name.setdefault(
+            insight_object.key_attribute_value, []).append(insight_object)
+        self._objects_by_key[insight_object.key] = insight_object
+
+    def index_object(self, insight_object):
+        # Индексы ведутся только для уже загруженных объектов
+        with self.index_lock:
+            if self._objects is None:
+                return
+            self.unindex_object(insight_object)
+            self._objects[insight_object.id] = insight_object
+            self.add_to_indexes(insight_object)
+            self.refetches_avoided += 1
+
+    def unindex_object(self, insight_object):
+        with self.index_lock:
+            if self._objects is None:
+                return
+            indexed = self._objects.pop(insight_object.id, None)
+            if indexed is None:
+                return
+            same_name = self._objects_by_name.get(
+                indexed.key_attribute_value, [])
+            same_name[:] = [
+                item for item in same_name if item.id != insight_object.id]
+            if not same_name:
+                self._objects_by_name.pop(indexed.key_attribute_value, None)
+            if self._objects_by_key.get(indexed.key) is indexed:
+                del self._objects_by_key[indexed.key]
+
+    def get_duplicate_names(self):
+        return [
+            name for name, objects in self.objects_by_name.items()
+            if len(objects) > 1]
+
     def get_objects(self):
         iql = f'objectType = "{self.name}"'
         logging.info(f"Ищем все объекты в разделе - {self.name}")
-        return self.schema.search_iql(iql)
+        # Раздел сам держит свои объекты, в кеш IQL его не кладём
+        return self.schema.search_iql(iql, use_cache=False)
+
+    def iter_objects(self):
+        iql = f'objectType = "{self.name}"'
+        logging.info(f"Потоково читаем объекты в разделе - {self.name}")
+        return self.schema.iter_iql(iql)
+
+    def sync_objects(self, snapshot_path, full_sync_interval=24 * 3600,
+                     overlap=300):
+        # Инкрементальная загрузка: с сервера забираем только объекты,
+        # изменённые после прошлого запуска, и вливаем их в снимок на диске.
+        # Удаления ловит периодическая полная сверка.
+        snapshot = ObjectTypeSnapshot(snapshot_path, self.id)
+        started = time.time()
+        iql = f'objectType = "{self.name}"'
+        full_sync = (
+            snapshot.watermark is None
+            or started - snapshot.last_full_sync >= full_sync_interval)
+        if full_sync:
+            logging.info(f"Полная сверка раздела {self.name}")
+            snapshot.objects = {
+                object_json["id"]: object_json
+                for object_json in self.schema.iter_iql_json(iql)}
+            snapshot.last_full_sync = started
+            fetched = len(snapshot.objects)
+        else:
+            # Относительное время в IQL не зависит от часового пояса сервера,
+            # overlap страхует от расхождения часов
+            minutes = int((started - snapshot.watermark + overlap) // 60) + 1
+            fetched = 0
+            for object_json in self.schema.iter_iql_json(
+                    f"{iql} AND updated >= now(-{minutes}m)"):
+                snapshot.objects[object_json["id"]] = object_json
+                fetched += 1
+            logging.info(
+                f"Раздел {self.name}: получено {fetched} изменённых объектов")
+        snapshot.watermark = started
+        snapshot.write()
+        self.load_objects_json(snapshot.objects.values())
+        return {
+            "full_sync": full_sync,
+            "fetched": fetched,
+            "objects": len(self._objects),
+        }
+
+    def load_objects_json(self, objects_json):
+        # Заменяет объекты типа объектами из готового JSON (снимок на диске)
+        objects = {}
+        for object_json in objects_json:
+            insight_object = InsightObject(
+                self.insight, object_json["id"], object_json)
+            objects[insight_object.id] = insight_object
+            self.insight.register_object(insight_object)
+        self._objects = objects
+        self.build_indexes()
+        return objects
 
     @property
     def object_type_attributes(self):
-        if self._object_type_attributes is None:
-            self._object_type_attributes = self.get_object_type_attributes()
-        return self._object_type_attributes
+        cache_key = ("objecttype", self.id)
+        object_type_attributes = self.insight.cache.get(
+            "attributes", cache_key)
+        if object_type_attributes is None:
+            with self.insight.metadata_lock:
+                object_type_attributes = self.insight.cache.get(
+                    "attributes", cache_key)
+                if object_type_attributes is None:
+                    object_type_attributes = self.get_object_type_attributes()
+                    self.insight.cache.set(
+                        "attributes", cache_key, object_type_attributes)
+        return object_type_attributes
 
     def get_object_type_attributes(self):
         object_type_attributes_json = self.insight.do_api_request(
@@ -224,19 +2000,70 @@ class InsightObjectType:
             ] = InsightObjectTypeAttribute(self, object_type_attribute_json)
         return object_type_attributes
 
+    @property
+    def attribute_ids(self):
+        object_type_attributes = self.object_type_attributes
+        # Пересобираем индекс, если определения атрибутов перечитаны
+        if self._attribute_ids_source is not object_type_attributes:
+            self._attribute_ids = {
+                value.name: key
+                for key, value in object_type_attributes.items()}
+            self._attribute_ids_source = object_type_attributes
+        return self._attribute_ids
+
     def get_id_object_type_attribute(self, name):
-        check = [
-            key for key, value in self.object_type_attributes.items() if value.name == name
-        ]
-        if check:
-            return check[0]
+        return self.attribute_ids.get(name)
+
+    def get_name_object_type_attribute(self, attribute_id):
+        attribute = self.object_type_attributes.get(attribute_id)
+        if attribute:
+            return attribute.name
 
     def get_object(self, name):
-        check = [
-            object for object in self.objects.values() if object.name == name
-        ]
-        if check:
-            return check[0]
+        check = self.objects_by_name.get(name)
+        if not check:
+            return None
+        if len(check) > 1:
+            raise DuplicateObjectError(
+                f"В разделе {self.name} {len(check)} объектов с именем "
+                f"{name}: {', '.join(item.key for item in check)}")
+        return check[0]
+
+    def get_objects_by_name(self, name):
+        return list(self.objects_by_name.get(name, []))
+
+    def get_object_by_key(self, object_key):
+        return self.objects_by_key.get(object_key)
+
+    def get_object_by_id(self, object_id):
+        return self.objects.get(object_id)
+
+    def find_object(self, value):
+        # Ссылка в источнике задаётся именем, objectKey или id объекта.
+        # Имя проверяется первым: objectKey или число может быть и именем
+        insight_object = self.get_object(value)
+        if insight_object is None:
+            insight_object = self.get_object_by_key(value)
+        if insight_object is None and str(value).isdigit():
+            insight_object = self.get_object_by_id(int(value))
+        return insight_object
+
+    def has_object(self, value):
+        # Как find_object, но без ошибки на неуникальном имени
+        if value in self.objects_by_name or value in self.objects_by_key:
+            return True
+        return str(value).isdigit() and int(value) in self.objects
+
+    def resolve_references(self):
+        return self.insight.resolve_references(self.objects.values())
+
+    def to_frame(self, attribute_names=None, stream=False):
+        # stream=True строит фрейм из потокового чтения, не загружая objects
+        frame = ObjectFrame(self, attribute_names)
+        objects = self.iter_objects() if stream else self.objects.values()
+        for insight_object in objects:
+            frame.append(insight_object)
+        return frame
 
 
 class InsightObjectTypeAttribute:
@@ -290,28 +2117,154 @@ class InsightObjectTypeAttribute:
         return f"InsightObjectTypeAttribute: {self.name}"
 
 
+class AttributeLayout:
+    # Раскладка атрибутов типа: id атрибута -> номер ячейки в values объекта.
+    # Одна на тип, объекты хранят только список значений
+    __slots__ = ("object_schema", "slots", "attribute_ids", "names", "lock")
+
+    def __init__(self, object_schema):
+        self.object_schema = object_schema
+        self.slots = {}
+        self.attribute_ids = []
+        self.names = None
+        self.lock = threading.Lock()
+
+    def __str__(self):
+        return f"AttributeLayout: {len(self.attribute_ids)} атрибутов"
+
+    def get_slot(self, attribute_id):
+        slot = self.slots.get(attribute_id)
+        if slot is None:
+            with self.lock:
+                slot = self.slots.get(attribute_id)
+                if slot is None:
+                    slot = len(self.attribute_ids)
+                    self.attribute_ids.append(attribute_id)
+                    self.slots[attribute_id] = slot
+                    self.names = None
+        return slot
+
+    def get_slot_by_name(self, name):
+        names = self.names
+        if names is None:
+            definitions = self.object_schema.object_type_attributes
+            names = {
+                definitions[attribute_id].name: slot
+                for slot, attribute_id in enumerate(list(self.attribute_ids))
+                if attribute_id in definitions}
+            self.names = names
+        return names.get(name)
+
+
 class InsightObject:
+    __slots__ = (
+        "insight", "id", "name", "key", "object_type_id", "object_schema",
+        "layout", "values", "object_json", "_attributes", "JIRA_issues",
+    )
+
     def __init__(self, insight, object_id, object_json=None):
         self.insight = insight
         self.id = object_id
-        self.object_json = object_json
-        if not self.object_json:
-            self.object_json = self.insight.do_api_request(
-                f"/object/{self.id}")
-        self.name = self.object_json["label"]
-        self.object_schema = self.insight.object_schemas[
-            self.object_json["objectType"]["objectSchemaId"]
-        ]
-        self.attributes = {}
-        for attribute_json in self.object_json["attributes"]:
-            attribute_object = InsightObjectAttribute(
-                self,
-                attribute_json["objectTypeAttributeId"],
-                attribute_json["objectAttributeValues"],
-            )
-            self.attributes[attribute_object.name] = attribute_object
+        if not object_json:
+            cached_object = self.insight.cache.get("object", self.id)
+            if cached_object is not None:
+                self.copy_from(cached_object)
+                return
+            object_json = self.insight.do_api_request(f"/object/{self.id}")
+        self.load_json(object_json)
 
-    def update_object(self, attributes: dict):
+    def load_json(self, object_json):
+        self.name = object_json["label"]
+        self.key = object_json.get("objectKey", None)
+        self.object_type_id = object_json["objectType"]["id"]
+        self.object_schema = self.insight.get_schema(
+            object_json["objectType"]["objectSchemaId"])
+        self.layout = self.object_schema.get_layout(self.object_type_id)
+        # Значения декодируются только при обращении
+        keep_object_json = self.insight.keep_object_json
+        values = []
+        for attribute_json in object_json["attributes"]:
+            slot = self.layout.get_slot(attribute_json["objectTypeAttributeId"])
+            if slot >= len(values):
+                values.extend([None] * (slot + 1 - len(values)))
+            values_json = attribute_json["objectAttributeValues"]
+            if not keep_object_json:
+                values_json = self.compact_values(values_json)
+            values[slot] = values_json
+        self.values = values
+        self._attributes = None
+        self.object_json = object_json if keep_object_json else None
+
+    @staticmethod
+    def compact_values(values_json):
+        # Простые значения храним кортежем строк вместо списка словарей
+        if all(value_json.keys() <= {"value", "displayValue", "searchValue"}
+               for value_json in values_json):
+            return tuple(value_json.get("value") for value_json in values_json)
+        return values_json
+
+    def copy_from(self, insight_object):
+        for name in (
+                "name", "key", "object_type_id", "object_schema", "layout",
+                "values", "object_json"):
+            setattr(self, name, getattr(insight_object, name))
+        self._attributes = None
+
+    @property
+    def attributes(self):
+        if self._attributes is None:
+            attributes = {}
+            for attribute_id, values_json in self.iter_values():
+                attribute_object = InsightObjectAttribute(
+                    self, attribute_id, values_json)
+                attributes[attribute_object.name] = attribute_object
+            self._attributes = attributes
+        return self._attributes
+
+    def iter_values(self):
+        # (id атрибута, сырые значения) без создания объектов атрибутов
+        attribute_ids = self.layout.attribute_ids
+        for slot, values_json in enumerate(self.values):
+            if values_json is not None:
+                yield attribute_ids[slot], self.expand_values(values_json)
+
+    @staticmethod
+    def expand_values(values_json):
+        if isinstance(values_json, tuple):
+            return [{"value": value} for value in values_json]
+        return values_json
+
+    def get_attribute(self, name):
+        if self._attributes is not None:
+            return self._attributes.get(name)
+        slot = self.layout.get_slot_by_name(name)
+        if (slot is None or slot >= len(self.values)
+                or self.values[slot] is None):
+            return None
+        return InsightObjectAttribute(
+            self, self.layout.attribute_ids[slot],
+            self.expand_values(self.values[slot]))
+
+    def get_value(self, name, default=None):
+        attribute = self.get_attribute(name)
+        if attribute is None:
+            return default
+        return attribute.value
+
+    @property
+    def object_type(self):
+        return self.object_schema.object_types.get(self.object_type_id)
+
+    @property
+    def key_attribute_value(self):
+        # Значение KEY_ATTRIBUTE, по которому объект связывается с источником
+        value = self.get_value(KEY_ATTRIBUTE)
+        if value is None or isinstance(value, list):
+            return self.name
+        return value
+
+    @staticmethod
+    def make_request_body(object_type_id, attributes: dict):
         attributes_json = []
         for attribute_id, value in attributes.items():
             if isinstance(value, list):
@@ -324,15 +2277,55 @@ class InsightObject:
                 "objectAttributeValues": value_list,
             }
             attributes_json.append(entry)
-        request_body = {
-            "objectTypeId": self.object_json["objectType"]["id"],
-            "attributes": attributes_json,
-        }
+        return {"objectTypeId": object_type_id, "attributes": attributes_json}
+
+    @staticmethod
+    def is_full_json(response):
+        return bool(response) and "attributes" in response \
+            and "objectType" in response
+
+    def update_object(self, attributes: dict):
+        request_body = self.make_request_body(self.object_type_id, attributes)
         response = self.insight.do_api_request(
             "/object/{}".format(self.id), method="put", json=request_body
         )
+        self.apply_update(response)
+        return response
+
+    def forget_attribute_values(self):
+        object_type = self.object_type
+        if object_type is None:
+            return
+        for attribute_id in object_type.object_type_attributes:
+            self.insight.cache.invalidate(
+                "object_attribute", (self.id, attribute_id))
+
+    def apply_update(self, response):
+        self.forget_attribute_values()
+        object_type = self.object_type
+        if object_type:
+            object_type.unindex_object(self)
+        if self.is_full_json(response):
+            self.load_json(response)
+        if object_type:
+            object_type.index_object(self)
+        self.insight.register_object(self)
+        self.insight.invalidate_searches()
+
+    def delete_object(self):
+        response = self.insight.do_api_request(
+            f"/object/{self.id}", method="delete")
+        self.apply_delete()
         return response
 
+    def apply_delete(self):
+        self.forget_attribute_values()
+        object_type = self.object_type
+        if object_type:
+            object_type.unindex_object(self)
+        self.insight.forget_object(self.id)
+        self.insight.invalidate_searches()
+
     def get_jira_issues(self):
         self.JIRA_issues = self.insight.do_api_request(
                 f"/object/{self.id}/jiraissues")
@@ -342,6 +2335,9 @@ class InsightObject:
 
 
 class InsightObjectAttribute:
+    __slots__ = (
+        "insight_object", "id", "object_type_attribute", "name", "values_json")
+
     def __init__(self, insight_object, attribute_id, values_json=None):
         self.insight_object = insight_object
         self.id = attribute_id
@@ -356,31 +2352,26 @@ class InsightObjectAttribute:
     @property
     def value(self):
         if self.values_json is None:
-            self.values_json = (
-                self.insight_object.object_schema.insight.do_api_request(
+            insight = self.insight_object.insight
+            # Значения своего объекта, запись сбрасывается при изменении
+            # и удалении объекта
+            cache_key = (self.insight_object.id, self.id)
+            self.values_json = insight.cache.get("object_attribute", cache_key)
+            if self.values_json is None:
+                self.values_json = insight.do_api_request(
                     f"/objectattribute/{self.id}")
-                )
+                insight.cache.set(
+                    "object_attribute", cache_key, self.values_json)
 
         if not self.values_json:
             return None
 
-        if self.object_type_attribute.attribute_type in [
-                "User", "Object", "Select"
-                ]:
-            value = []
-            for value_json in self.values_json:
-                if self.object_type_attribute.attribute_type in [
-                        "User", "Select"]:
-                    value.append(value_json.get("value", None))
-                    continue
-                if self.object_type_attribute.attribute_type == "Object":
-                    insight_object = InsightObject(
-                        self.insight_object.insight,
-                        value_json["referencedObject"]["id"],
-                    )
-                    value.append(insight_object)
-                    continue
-            return value
+        if self.object_type_attribute.attribute_type == "Object":
+            return self.get_referenced_objects()
+        if self.object_type_attribute.attribute_type in ["User", "Select"]:
+            return [
+                value_json.get("value", None)
+                for value_json in self.values_json]
         else:
             value_json = self.values_json[0]
             if self.object_type_attribute.attribute_type in [
@@ -401,9 +2392,377 @@ class InsightObjectAttribute:
             if self.object_type_attribute.attribute_type == "Boolean":
                 return value_json.get("value", "false") == "true"
 
+    def referenced_ids(self):
+        return [
+            value_json["referencedObject"]["id"]
+            for value_json in self.values_json or []]
+
+    def get_referenced_objects(self):
+        insight = self.insight_object.insight
+        object_ids = self.referenced_ids()
+        referenced = {}
+        unresolved = False
+        for object_id in object_ids:
+            insight_object = insight.cache.get("object", object_id)
+            if insight_object is not None:
+                referenced[object_id] = insight_object
+            elif not insight.is_missing_object(object_id):
+                unresolved = True
+        if unresolved:
+            # Если объект из загруженного раздела, подтягиваем ссылки
+            # этого атрибута сразу для всего раздела
+            object_type = self.insight_object.object_type
+            if (object_type is not None and object_type._objects
+                    and self.insight_object.id in object_type._objects):
+                referenced.update(insight.resolve_references(
+                    object_type._objects.values(), {self.id}))
+            else:
+                referenced.update(insight.resolve_references(
+                    [self.insight_object], {self.id}))
+        return [
+            referenced[object_id] for object_id in object_ids
+            if object_id in referenced]
+
     def __str__(self):
         return f"InsightObjectAttribute: {self.name}, Value: {self.value}"
 
+class FrameColumn:
+    # Колонка ObjectFrame: типизированный массив значений и маска пропусков.
+    # Текст и ссылки хранятся кодами в список интернированных категорий
+    KINDS = {
+        "Integer": ("q", int),
+        "Double": ("d", float),
+        "Boolean": ("b", None),
+        "Date": ("d", None),
+        "Date Time": ("d", None),
+    }
+
+    __slots__ = (
+        "name", "attribute_id", "attribute_type", "typecode", "data",
+        "missing", "categories", "category_codes")
+
+    def __init__(self, name, attribute_id, attribute_type):
+        self.name = name
+        self.attribute_id = attribute_id
+        self.attribute_type = attribute_type
+        # Для текстовых колонок "l" - код категории, -1 пропуск
+        self.typecode = self.KINDS.get(attribute_type, ("l", None))[0]
+        self.data = array(self.typecode)
+        self.missing = array("b")
+        self.categories = []
+        self.category_codes = {}
+
+    def __str__(self):
+        return f"FrameColumn: {self.name} ({self.attribute_type})"
+
+    def __len__(self):
+        return len(self.data)
+
+    @property
+    def is_category(self):
+        return self.attribute_type not in self.KINDS
+
+    def append(self, values_json):
+        # values_json - сырые значения ячейки из раскладки объекта
+        if not values_json:
+            self.append_missing()
+            return
+        if isinstance(values_json, tuple):
+            values = values_json
+        elif self.attribute_type == "Object":
+            values = tuple(
+                value_json["referencedObject"]["objectKey"]
+                for value_json in values_json)
+        elif self.attribute_type == "Status":
+            values = tuple(
+                str((value_json.get("status") or {}).get("name"))
+                for value_json in values_json)
+        else:
+            values = tuple(value_json.get("value") for value_json in values_json)
+        if self.is_category:
+            self.append_category(values[0] if len(values) == 1 else values)
+            return
+        value = values[0]
+        try:
+            if self.attribute_type == "Boolean":
+                value = 1 if str(value).lower() == "true" else 0
+            elif self.attribute_type in ("Date", "Date Time"):
+                parsed = parse_date(value)
+                if parsed is None:
+                    raise ValueError(value)
+                if parsed.tzinfo is None:
+                    parsed = parsed.replace(tzinfo=timezone.utc)
+                value = parsed.timestamp()
+            else:
+                value = self.KINDS[self.attribute_type][1](value)
+        except (TypeError, ValueError):
+            self.append_missing()
+            return
+        self.data.append(value)
+        self.missing.append(0)
+
+    def append_missing(self):
+        self.data.append(-1 if self.is_category else 0)
+        self.missing.append(1)
+
+    def encode(self, value):
+        # Значение в представлении data: числа, логические 0/1, даты - epoch
+        if self.attribute_type == "Boolean":
+            if isinstance(value, str):
+                return 1 if value.lower() == "true" else 0
+            return 1 if value else 0
+        if self.attribute_type in ("Date", "Date Time"):
+            if isinstance(value, (int, float)):
+                return float(value)
+            if isinstance(value, str):
+                parsed = parse_date(value)
+                if parsed is None:
+                    raise ValueError(f'Incorect value {value}')
+                value = parsed
+            if not isinstance(value, datetime):
+                value = datetime(value.year, value.month, value.day)
+            if value.tzinfo is None:
+                value = value.replace(tzinfo=timezone.utc)
+            return value.timestamp()
+        return self.KINDS[self.attribute_type][1](value)
+
+    def append_category(self, value):
+        if isinstance(value, tuple):
+            # Порядок значений в многозначных атрибутах не важен
+            value = tuple(sorted(value, key=str))
+        elif isinstance(value, str):
+            value = sys.intern(value)
+        code = self.category_codes.get(value)
+        if code is None:
+            code = len(self.categories)
+            self.categories.append(value)
+            self.category_codes[value] = code
+        self.data.append(code)
+        self.missing.append(0)
+
+    def get(self, row):
+        if self.missing[row]:
+            return None
+        value = self.data[row]
+        if self.is_category:
+            return self.categories[value]
+        if self.attribute_type == "Boolean":
+            return bool(value)
+        return value
+
+    def to_list(self):
+        return [self.get(row) for row in range(len(self.data))]
+
+    def to_numpy(self):
+        if numpy is None:
+            raise ImportError("Для to_numpy требуется numpy")
+        # Копия, иначе array нельзя будет дополнять, пока жив numpy-массив
+        return numpy.frombuffer(self.data, dtype=self.typecode).copy()
+
+
+class ObjectFrame:
+    # Колоночное представление объектов типа: каждое значение декодируется
+    # один раз, дальнейшие сравнения и агрегации идут по массивам
+    def __init__(self, object_type, attribute_names=None):
+        self.object_type_id = object_type.id
+        self.ids = array("q")
+        self.keys = []
+        self.names = []
+        self.columns = {}
+        self.row_by_id = {}
+        for attribute_id, attribute in object_type.object_type_attributes.items():
+            if attribute_names is not None and attribute.name not in attribute_names:
+                continue
+            self.columns[attribute.name] = FrameColumn(
+                attribute.name, attribute_id, attribute.attribute_type)
+
+    def __str__(self):
+        return (
+            f"ObjectFrame: {len(self.ids)} объектов, "
+            f"{len(self.columns)} колонок")
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def append(self, insight_object):
+        self.row_by_id[insight_object.id] = len(self.ids)
+        self.ids.append(insight_object.id)
+        self.keys.append(insight_object.key)
+        self.names.append(sys.intern(insight_object.name))
+        slots = insight_object.layout.slots
+        values = insight_object.values
+        for column in self.columns.values():
+            slot = slots.get(column.attribute_id)
+            column.append(
+                values[slot] if slot is not None and slot < len(values)
+                else None)
+
+    # Операторы filter: сравнение значения ячейки со значением фильтра
+    FILTER_OPS = {
+        "==": operator.eq,
+        "!=": operator.ne,
+        "<": operator.lt,
+        "<=": operator.le,
+        ">": operator.gt,
+        ">=": operator.ge,
+        "in": lambda item, values: item in values,
+    }
+
+    def filter(self, name, predicate, value=None):
+        # Строки, где predicate(значение) истинно. predicate - функция
+        # или оператор из FILTER_OPS со значением value ("in" - набор
+        # значений). Операторы с NumPy считаются маской по массиву колонки,
+        # пропуск подходит только под "!="
+        column = self.columns[name]
+        if callable(predicate):
+            return [
+                row for row in range(len(self.ids))
+                if predicate(column.get(row))]
+        compare = self.FILTER_OPS.get(predicate)
+        if compare is None:
+            raise ValueError(f'Incorect value {predicate}')
+        if column.is_category:
+            # Оператор считается один раз на категорию, не на строку
+            matches = [
+                compare(category, value) for category in column.categories]
+            matches.append(predicate == "!=")
+            if numpy is not None:
+                codes = numpy.frombuffer(column.data, dtype=column.typecode)
+                return numpy.nonzero(
+                    numpy.array(matches, dtype=bool)[codes])[0].tolist()
+            return [
+                row for row, code in enumerate(column.data) if matches[code]]
+        if predicate == "in":
+            value = [column.encode(item) for item in value]
+        else:
+            value = column.encode(value)
+        if numpy is not None:
+            data = numpy.frombuffer(column.data, dtype=column.typecode)
+            present = numpy.frombuffer(column.missing, dtype="b") == 0
+            if predicate == "in":
+                mask = numpy.isin(data, value)
+            else:
+                mask = compare(data, value)
+            mask = mask | ~present if predicate == "!=" else mask & present
+            return numpy.nonzero(mask)[0].tolist()
+        return [
+            row for row, (item, missing) in enumerate(
+                zip(column.data, column.missing))
+            if (predicate == "!=" if missing else compare(item, value))]
+
+    def count_by(self, name):
+        column = self.columns[name]
+        if column.is_category:
+            if numpy is not None:
+                codes = numpy.frombuffer(column.data, dtype=column.typecode)
+                counts = numpy.bincount(
+                    codes[codes >= 0], minlength=len(column.categories))
+            else:
+                counts = [0] * len(column.categories)
+                for code in column.data:
+                    if code >= 0:
+                        counts[code] += 1
+            return {
+                category: int(count)
+                for category, count in zip(column.categories, counts)}
+        if numpy is not None:
+            data = numpy.frombuffer(column.data, dtype=column.typecode)
+            missing = numpy.frombuffer(column.missing, dtype="b") != 0
+            values, counts = numpy.unique(data[~missing], return_counts=True)
+            result = dict(zip(values.tolist(), counts.tolist()))
+            missing_count = int(missing.sum())
+        else:
+            result = {}
+            missing_count = 0
+            for value, missing in zip(column.data, column.missing):
+                if missing:
+                    missing_count += 1
+                else:
+                    result[value] = result.get(value, 0) + 1
+        if column.attribute_type == "Boolean":
+            result = {bool(value): count for value, count in result.items()}
+        if missing_count:
+            result[None] = missing_count
+        return result
+
+    def sum(self, name):
+        column = self.columns[name]
+        if numpy is not None:
+            data = numpy.frombuffer(column.data, dtype=column.typecode)
+            mask = numpy.frombuffer(column.missing, dtype="b") == 0
+            return data[mask].sum().item()
+        return sum(
+            value for value, missing in zip(column.data, column.missing)
+            if not missing)
+
+    def diff(self, other, columns=None):
+        # {колонка: [id объектов с отличиями]} для объектов, есть в обоих
+        common = [
+            object_id for object_id in self.ids
+            if object_id in other.row_by_id]
+        rows = array("q", (self.row_by_id[object_id] for object_id in common))
+        other_rows = array(
+            "q", (other.row_by_id[object_id] for object_id in common))
+        result = {}
+        for name in columns or self.columns:
+            if name not in other.columns:
+                continue
+            changed = self.diff_column(
+                self.columns[name], other.columns[name], rows, other_rows)
+            if changed:
+                result[name] = [common[index] for index in changed]
+        return result
+
+    @staticmethod
+    def diff_column(column, other_column, rows, other_rows):
+        if column.is_category:
+            # Коды разных фреймов не совпадают, переводим через категории
+            mapping = array("l", (
+                other_column.category_codes.get(category, -2)
+                for category in column.categories))
+            if numpy is not None:
+                # Последний элемент -1 обслуживает пропуски с кодом -1
+                mapping = numpy.append(
+                    numpy.frombuffer(mapping, dtype="l"), -1)
+                codes = numpy.frombuffer(column.data, dtype="l")
+                other_codes = numpy.frombuffer(other_column.data, dtype="l")
+                left = mapping[codes[numpy.frombuffer(rows, dtype="q")]]
+                right = other_codes[numpy.frombuffer(other_rows, dtype="q")]
+                return numpy.nonzero(left != right)[0].tolist()
+            left = [
+                mapping[column.data[row]] if column.data[row] >= 0 else -1
+                for row in rows]
+            right = [other_column.data[row] for row in other_rows]
+            return [
+                index for index, (value, other_value)
+                in enumerate(zip(left, right)) if value != other_value]
+        if numpy is not None:
+            rows_index = numpy.frombuffer(rows, dtype="q")
+            other_index = numpy.frombuffer(other_rows, dtype="q")
+            data = numpy.frombuffer(
+                column.data, dtype=column.typecode)[rows_index]
+            other_data = numpy.frombuffer(
+                other_column.data, dtype=other_column.typecode)[other_index]
+            missing = numpy.frombuffer(column.missing, dtype="b")[rows_index]
+            other_missing = numpy.frombuffer(
+                other_column.missing, dtype="b")[other_index]
+            changed = (missing != other_missing) | (
+                (missing == 0) & (data != other_data))
+            return numpy.nonzero(changed)[0].tolist()
+        return [
+            index for index, (row, other_row) in enumerate(zip(rows, other_rows))
+            if column.missing[row] != other_column.missing[other_row]
+            or not column.missing[row]
+            and column.data[row] != other_column.data[other_row]]
+
+    def to_numpy(self):
+        return {
+            name: column.to_numpy() for name, column in self.columns.items()}
+
+
 class Mixer:
     def __init__(self, datasource, target):
         if not isinstance(datasource, DataSource):
@@ -414,21 +2773,22 @@ class Mixer:
         self.target = target
         self.schema = datasource.object_type.schema
         self.object_type = datasource.object_type
-        self.object_type_attributes = datasource.object_type.object_type_attributes.items()
+        self.metrics = target.insight.metrics
         self.update_objects = {}
         self.create_objects = {}
         self.object_types = {}
-        self._unique_src_attrs = set(
-            [attribute for record in datasource.source for attribute in record])
-        self.attributes_id = {attr_name: [
-            value.id for id, value 
-            in self.object_type_attributes
-            if value.name == attr_name][0] for attr_name
-            in self._unique_src_attrs}
+        with self.metrics.phase("schema_load"):
+            self.object_type_attributes = datasource.object_type.object_type_attributes.items()
+            # Источник может читаться потоково, поэтому атрибуты источника
+            # проверяются при построении плана, а не заранее
+            self.attributes_id = self.object_type.attribute_ids
         self.references_attributes = {
             value.name: value.referenceObjectTypeId for _, value in self.object_type_attributes
             if hasattr(value, 'referenceObjectTypeId')
         }
+        self.update_stats = {}
+        # WriteResult ссылок, созданных iter_plans до первой части
+        self.reference_results = {}
 
     def __str__(self):
         return f"Mixer: {self.datasource} с {self.target}"
@@ -439,110 +2799,600 @@ class Mixer:
 
     def get_existing_names(self, objects='update'):
         # Имена объектов в схеме:
-        schema_objects = set([object.name for object  in self.datasource.object_type.objects.values()])
+        schema_objects = set(self.object_type.objects_by_name)
         # Имена Объектов в исходнике:
-        source_objects = set([
-        value for record in self.datasource.source for attribute, value in record.items()
-        if attribute.lower() == 'name'
-        ])
-        if objects=='update':
+        source_objects = self.datasource.get_names()
+        if objects == 'update':
             return source_objects.intersection(schema_objects)
-        if objects == 'cretae':
+        if objects == 'create':
             return source_objects.difference(schema_objects)
-        if objects =='disable':
+        if objects == 'disable':
             return schema_objects.difference(source_objects)
 
     def get_schema_object_attribute(self, id_object_type, object_name, attribute='objectKey'):
         # Функция для поиска атрибута, по умолчанию ищет objectKey. Можно искать id по имени.
-        objects = self.target.object_types[id_object_type].objects
-        check = [
-        object.object_json[attribute]
-        for object in objects.values() if object.name == object_name]
-        if check:
-            return check[0]
-
-    def make_dicts_for_update_schema_objects(self):
-        names_objects_for_update = self.get_existing_names()
-        result = {}
-        for name in names_objects_for_update:
-            # Ищем id объекта
-            id = self.get_schema_object_attribute(self.object_type.id, name, 'id')
-            result[id] = {}
-            for attr_name, attr_value in self.datasource.objects[name].items():
-                attribute_id = self.attributes_id[attr_name]
-                if attr_name in self.references_attributes:
-                    reference_id = self.references_attributes[attr_name]
-                    reference_obj_type = self.schema.object_types[reference_id]
-                    if not isinstance(attr_value, list):
-                        if reference_obj_type.get_object(attr_value) is None:
-                            name_id = reference_obj_type.get_id_object_type_attribute('Name')
-                            reference_obj_type.create_object({name_id: attr_value})
-                            continue
-                        else:
-                            value = self.get_schema_object_attribute(reference_id, attr_value)
-                    else:
-                        value = []
-                        for object in attr_value:
-                            if reference_obj_type.get_object(object) is None:
-                                name_id = reference_obj_type.get_id_object_type_attribute('Name')
-                                reference_obj_type.create_object({name_id: attr_value})
-                                continue
-                            else:
-                                obj_key = self.get_schema_object_attribute(reference_id, object)
-                                value.append(obj_key)
-                else:
-                    value = attr_value
-                result[id][attribute_id]=value
+        object = self.target.object_types[id_object_type].get_object(object_name)
+        if object is None:
+            return None
+        if attribute == 'objectKey':
+            return object.key
+        if attribute == 'id':
+            return object.id
+        if attribute == 'label':
+            return object.name
+        return object.object_json[attribute]
+
+    @classmethod
+    def normalize_value(cls, attribute_type, value):
+        # Приводит значение из источника и из Insight к одному виду
+        if isinstance(value, list):
+            values = [cls.normalize_value(attribute_type, item) for item in value]
+            values = [item for item in values if item is not None]
+            return sorted(values, key=str) or None
+        if attribute_type == "Status" and isinstance(value, dict):
+            # Insight отдаёт статус словарём, источник задаёт его именем
+            value = value.get("name")
+        if value is None or value == "":
+            return None
+        try:
+            if attribute_type == "Integer":
+                return int(float(value))
+            if attribute_type == "Double":
+                return float(value)
+        except (TypeError, ValueError):
+            return str(value).strip()
+        if attribute_type == "Boolean":
+            if isinstance(value, str):
+                return value.strip().lower() in ("true", "1", "yes", "да")
+            return bool(value)
+        if attribute_type in ("Date", "Date Time") and isinstance(value, str):
+            parsed = parse_date(value)
+            if parsed is not None:
+                if attribute_type == "Date":
+                    return parsed.date()
+                return parsed.replace(tzinfo=None)
+        return str(value).strip()
+
+    def is_attribute_changed(self, insight_object, attr_name, value):
+        attribute = insight_object.get_attribute(attr_name)
+        if attr_name in self.references_attributes:
+            # Ссылки сравниваем по objectKey, порядок не важен
+            current = [
+                value_json["referencedObject"]["objectKey"]
+                for value_json in (attribute.values_json or [])
+            ] if attribute else []
+            if not isinstance(value, list):
+                value = [value]
+            return self.normalize_value("Text", value) != self.normalize_value(
+                "Text", current)
+        attribute_type = self.object_type.object_type_attributes[
+            self.attributes_id[attr_name]].attribute_type
+        current = attribute.value if attribute else None
+        if isinstance(current, list) and not isinstance(value, list):
+            value = [value]
+        return self.normalize_value(
+            attribute_type, value) != self.normalize_value(
+            attribute_type, current)
+
+    def collect_missing_references(self, records=None):
+        # {id типа ссылки: [имена]} - ссылки из источника, которых нет в Insight
+        missing = {}
+        if records is None:
+            records = self.datasource
+        else:
+            records = records.values()
+        reference_types = {
+            reference_id: self.schema.object_types[reference_id]
+            for reference_id in set(self.references_attributes.values())}
+        for record in records:
+            for attr_name, reference_id in self.references_attributes.items():
+                values = record.get(attr_name)
+                if values is None:
+                    continue
+                if not isinstance(values, list):
+                    values = [values]
+                reference_type = reference_types[reference_id]
+                for name in values:
+                    # Значение может быть objectKey или id существующей ссылки
+                    if (name not in (None, "")
+                            and not reference_type.has_object(name)):
+                        missing.setdefault(reference_id, {})[name] = None
+        return {
+            reference_id: list(names)
+            for reference_id, names in missing.items()}
+
+    def create_missing_references(self, workers=None, rate=None):
+        # Каждая недостающая ссылка создаётся один раз до построения плана
+        return self.schema.create_references(
+            self.collect_missing_references(), workers, rate)
+
+    def resolve_reference(self, reference_obj_type, name):
+        reference = reference_obj_type.find_object(name)
+        if reference is None:
+            # Объекта ещё нет, в плане остаётся имя, ключ подставит execute
+            return name
+        return reference.key
+
+    def resolve_attribute(self, attr_name, attr_value):
+        if attr_name not in self.references_attributes:
+            return attr_value
+        reference_obj_type = self.schema.object_types[
+            self.references_attributes[attr_name]]
+        if isinstance(attr_value, list):
+            return [
+                self.resolve_reference(reference_obj_type, item)
+                for item in attr_value]
+        return self.resolve_reference(reference_obj_type, attr_value)
+
+    def make_payload(self, record, insight_object=None, compare=True):
+        # Словарь {id атрибута: значение} для записи источника. Для
+        # существующего объекта при compare остаются только изменения
+        payload = {}
+        for attr_name, attr_value in record.items():
+            if attr_name not in self.attributes_id:
+                raise ValueError(
+                    f'Incorect attribute {attr_name} for {self.object_type}')
+            value = self.resolve_attribute(attr_name, attr_value)
+            if (insight_object is not None and compare
+                    and not self.is_attribute_changed(
+                        insight_object, attr_name, value)):
+                continue
+            payload[self.attributes_id[attr_name]] = value
+        return payload
+
+    def new_plan(self):
+        plan = SyncPlan(self.object_type.id)
+        plan.reference_attributes = {
+            self.object_type.attribute_ids[attr_name]: reference_id
+            for attr_name, reference_id in self.references_attributes.items()}
+        plan.stats = {
+            "create": 0, "update": 0, "unchanged": 0, "skipped": 0,
+            "disable": 0, "attributes": 0}
+        return plan
+
+    def plan_records(self, records, compare=True):
+        # Хеш-соединение части источника {имя: запись} с индексом раздела
+        plan = self.new_plan()
+        plan.references = self.collect_missing_references(records)
+        stats = plan.stats
+        schema_objects = self.object_type.objects_by_name
+        for name, record in records.items():
+            found = schema_objects.get(name)
+            if found and len(found) > 1:
+                logging.warning(
+                    f"Объект {name} пропущен: в Insight {len(found)} "
+                    f"объектов с таким именем")
+                stats["skipped"] += 1
+                continue
+            insight_object = found[0] if found else None
+            try:
+                payload = self.make_payload(record, insight_object, compare)
+            except DuplicateObjectError as error:
+                logging.warning(f"Объект {name} пропущен: {error}")
+                stats["skipped"] += 1
+                continue
+            if insight_object is None:
+                plan.create[name] = payload
+                stats["create"] += 1
+                continue
+            if not payload:
+                stats["unchanged"] += 1
+                continue
+            plan.update[insight_object.id] = payload
+            stats["update"] += 1
+            stats["attributes"] += len(payload)
+        return plan
+
+    def plan_disable(self, source_names):
+        plan = self.new_plan()
+        for name, objects in self.object_type.objects_by_name.items():
+            if name in source_names:
+                continue
+            for insight_object in objects:
+                plan.disable[insight_object.id] = name
+                plan.stats["disable"] += 1
+        return plan
+
+    def iter_plans(self, chunk_size=10000, compare=True,
+                   create_references=True):
+        # Источник обрабатывается частями по chunk_size записей, на каждую
+        # часть свой план. Последний план содержит только отключение.
+        # create_references=False - сухой прогон без записи в Insight
+        self.reference_results = {}
+        if create_references:
+            with self.metrics.phase("reference_creation"):
+                self.reference_results = self.create_missing_references()
+        with self.metrics.phase("objects_load"):
+            # Объекты типа нужны для сравнения, загружаем их до первой части
+            self.object_type.objects
+        source_names = set()
+        chunks = self.datasource.iter_chunks(chunk_size)
+        while True:
+            with self.metrics.phase("source_load"):
+                records = next(chunks, None)
+            if records is None:
+                break
+            source_names.update(records)
+            with self.metrics.phase("planning"):
+                plan = self.plan_records(records, compare)
+            yield plan
+        with self.metrics.phase("planning"):
+            plan = self.plan_disable(source_names)
+        yield plan
+
+    def build_plan(self, compare=True, create_references=True,
+                   chunk_size=10000):
+        plan = self.new_plan()
+        for chunk_plan in self.iter_plans(
+                chunk_size, compare, create_references):
+            plan.merge(chunk_plan)
+        stats = plan.stats
+        self.update_stats = {
+            "changed": stats["update"], "unchanged": stats["unchanged"],
+            "skipped": stats["skipped"], "attributes": stats["attributes"]}
+        logging.info(f"{plan}")
+        return plan
+
+    def sync(self, chunk_size=10000, compare=True, workers=None, rate=None):
+        # Строит и сразу выполняет план по частям: в памяти только
+        # текущая часть источника. Отключение возвращается планом
+        results = {"references": {}, "create": [], "update": []}
+        disable_plan = None
+        for plan in self.iter_plans(chunk_size, compare):
+            if plan.disable:
+                disable_plan = plan
+                continue
+            chunk_results = plan.execute(self.schema, workers, rate)
+            for reference_id, reference_results in (
+                    chunk_results["references"].items()):
+                results["references"].setdefault(reference_id, []).extend(
+                    reference_results)
+            results["create"] += chunk_results["create"]
+            results["update"] += chunk_results["update"]
+        # Основную часть ссылок iter_plans создаёт до первой части источника
+        for reference_id, reference_results in self.reference_results.items():
+            results["references"][reference_id] = list(
+                reference_results) + results["references"].get(
+                reference_id, [])
+        results["disable"] = disable_plan or self.new_plan()
+        return results
+
+    def disable_missing(self, attributes=None, delete=False, max_ratio=0.2,
+                        max_count=None, workers=None, rate=None):
+        # Отключает или удаляет объекты, которых нет в источнике
+        plan = self.plan_disable(self.datasource.get_names())
+        logging.info(f"{plan}")
+        return plan.execute_disable(
+            self.target, attributes, delete, max_ratio, max_count, workers,
+            rate)
+
+    def make_dicts_for_update_schema_objects(self, compare=True):
+        # compare=False отправляет все атрибуты без сравнения с Insight
+        result = self.build_plan(compare).update
         self.update_objects.update(result)
         return result
 
-# TODO: Удалить дублирование схожего кода в функциях
     def make_dicts_for_create_schema_objects(self):
-        names_objects_for_update = self.get_existing_names('create')
-        result = {}
-        for name in names_objects_for_update:
-            # result[id] = {}
-            for attr_name, attr_value in self.datasource.objects[name].items():
-                attribute_id = self.attributes_id[attr_name]
-                if attr_name in self.references_attributes:
-                    reference_id = self.references_attributes[attr_name]
-                    reference_obj_type = self.schema.object_types[reference_id]
-                    if not isinstance(attr_value, list):
-                        if reference_obj_type.get_object(attr_value) is None:
-                            name_id = reference_obj_type.get_id_object_type_attribute('KEY_ATTRIBUTE')
-                            self.reference_obj_type.create_object({name_id: attr_value})
-                            continue
-                        else:
-                            value = self.get_schema_object_attribute(reference_id, attr_value)
-                    else:
-                        value = []
-                        for object in attr_value:
-                            if reference_obj_type.get_object(object) is None:
-                                name_id = reference_obj_type.get_id_object_type_attribute('KEY_ATTRIBUTE')
-                                self.reference_obj_type.create_object({name_id: attr_value})
-                                continue
-                            else:
-                                obj_key = self.get_schema_object_attribute(reference_id, object)
-                                value.append(obj_key)
-                else:
-                    value = attr_value
-                result[attribute_id]=value
-        self.update_objects.update(result)
+        result = self.build_plan().create
+        self.create_objects.update(result)
         return result
 
 
+class SyncPlan:
+    # План синхронизации: что создать, обновить и отключить.
+    # Можно сохранить для просмотра (dry-run) и выполнить позже
+    VERSION = 1
+
+    def __init__(self, object_type_id, create=None, update=None,
+                 disable=None, stats=None, references=None,
+                 reference_attributes=None):
+        self.object_type_id = object_type_id
+        # {id типа ссылки: [имена]} - ссылки, которые создаст execute
+        self.references = references or {}
+        # {id атрибута: id типа ссылки}
+        self.reference_attributes = reference_attributes or {}
+        # {имя: {id атрибута: значение}}
+        self.create = create or {}
+        # {id объекта: {id атрибута: значение}}
+        self.update = update or {}
+        # {id объекта: имя}
+        self.disable = disable or {}
+        self.stats = stats or {}
+
+    def __str__(self):
+        return (
+            f"SyncPlan: создать {len(self.create)}, обновить "
+            f"{len(self.update)}, отключить {len(self.disable)}")
+
+    def merge(self, other):
+        self.create.update(other.create)
+        self.update.update(other.update)
+        self.disable.update(other.disable)
+        for reference_id, names in other.references.items():
+            known = self.references.setdefault(reference_id, [])
+            known.extend(name for name in names if name not in known)
+        self.reference_attributes.update(other.reference_attributes)
+        for name, value in other.stats.items():
+            self.stats[name] = self.stats.get(name, 0) + value
+
+    def as_dict(self):
+        return {
+            "version": self.VERSION,
+            "object_type_id": self.object_type_id,
+            "create": self.create,
+            "update": self.update,
+            "disable": self.disable,
+            "stats": self.stats,
+            "references": self.references,
+            "reference_attributes": self.reference_attributes,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        if data.get("version") != cls.VERSION:
+            raise ValueError(f'Incorect plan version {data.get("version")}')
+
+        def attributes(payload):
+            return {int(key): value for key, value in payload.items()}
+
+        return cls(
+            data["object_type_id"],
+            {name: attributes(payload)
+             for name, payload in data["create"].items()},
+            {int(object_id): attributes(payload)
+             for object_id, payload in data["update"].items()},
+            {int(object_id): name
+             for object_id, name in data["disable"].items()},
+            data.get("stats"),
+            {int(reference_id): names
+             for reference_id, names in data.get("references", {}).items()},
+            attributes(data.get("reference_attributes", {})))
+
+    def execute_disable(self, schema, attributes=None, delete=False,
+                        max_ratio=0.2, max_count=None, workers=None,
+                        rate=None):
+        # Отключение объектов, пропавших из источника: attributes - значения
+        # для отключения ({"Status": "Выведен"}), delete=True - удаление.
+        # Слишком большой набор (доля от типа больше max_ratio или больше
+        # max_count объектов) прерывает выполнение до первого запроса на запись
+        if not delete and not attributes:
+            raise ValueError(f'Incorect value {attributes}')
+        object_type = schema.object_types[self.object_type_id]
+        object_ids = list(self.disable)
+        total = len(object_type.objects)
+        if max_count is not None and len(object_ids) > max_count:
+            raise DisableThresholdError(
+                f"Отключение {len(object_ids)} объектов больше "
+                f"порога {max_count}")
+        if (max_ratio is not None and total
+                and len(object_ids) / total > max_ratio):
+            raise DisableThresholdError(
+                f"Отключение {len(object_ids)} из {total} объектов "
+                f"больше доли {max_ratio}")
+        with schema.insight.metrics.phase("disable"):
+            existing = schema.existing_object_ids(object_ids)
+            missing = [
+                object_id for object_id in object_ids
+                if object_id not in existing]
+            object_ids = [
+                object_id for object_id in object_ids if object_id in existing]
+            # Уже удалённые на сервере объекты убираем из индексов типа
+            for object_id in missing:
+                insight_object = object_type.objects.get(object_id)
+                if insight_object is not None:
+                    insight_object.apply_delete()
+            if delete:
+                results = object_type.bulk_delete(object_ids, workers, rate)
+            else:
+                payload = {}
+                for name, value in attributes.items():
+                    attribute_id = name
+                    if not isinstance(name, int):
+                        attribute_id = object_type.get_id_object_type_attribute(
+                            name)
+                    if attribute_id is None:
+                        raise ValueError(f'Incorect value {name}')
+                    payload[attribute_id] = value
+                results = object_type.bulk_update(
+                    {object_id: dict(payload) for object_id in object_ids},
+                    workers, rate)
+        failed = len([result for result in results if not result.success])
+        logging.info(
+            f"{'Удалено' if delete else 'Отключено'} "
+            f"{len(results) - failed} из {len(results)} объектов, "
+            f"уже отсутствуют {len(missing)}")
+        return {
+            "deleted" if delete else "disabled": results,
+            "missing": missing,
+        }
+
+    def save(self, path):
+        with open(path, "w", encoding="utf-8") as plan_file:
+            json.dump(
+                self.as_dict(), plan_file, ensure_ascii=False, indent=2,
+                default=str)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding="utf-8") as plan_file:
+            return cls.from_dict(json.load(plan_file))
+
+    def execute(self, schema, workers=None, rate=None):
+        object_type = schema.object_types[self.object_type_id]
+        metrics = schema.insight.metrics
+        with metrics.phase("reference_creation"):
+            references = schema.create_references(
+                self.references, workers, rate)
+            if self.references:
+                self.resolve_references(schema)
+        with metrics.phase("writes"):
+            return {
+                "references": references,
+                "create": object_type.bulk_create(self.create, workers, rate),
+                "update": object_type.bulk_update(self.update, workers, rate),
+            }
+
+    def resolve_references(self, schema):
+        # Заменяет имена созданных ссылок на их objectKey
+        for payload in list(self.create.values()) + list(self.update.values()):
+            for attribute_id, reference_id in self.reference_attributes.items():
+                names = set(self.references.get(reference_id, []))
+                if attribute_id not in payload or not names:
+                    continue
+                reference_obj_type = schema.object_types[reference_id]
+                value = payload[attribute_id]
+                values = value if isinstance(value, list) else [value]
+                values = [
+                    self.resolve_reference(reference_obj_type, item)
+                    if item in names else item for item in values]
+                payload[attribute_id] = (
+                    values if isinstance(value, list) else values[0])
+        self.references = {}
+
+    @staticmethod
+    def resolve_reference(reference_obj_type, name):
+        # objectKey созданной ссылки. Неуникальное имя оставляем как есть,
+        # как plan_records пропускает неоднозначные записи
+        try:
+            reference = reference_obj_type.get_object(name)
+        except DuplicateObjectError as error:
+            logging.warning(f"Ссылка {name} не подставлена: {error}")
+            return name
+        return reference.key if reference is not None else name
+
+
+def iter_json_array(json_file, buffer_size=1 << 16):
+    # Потоковое чтение JSON массива объектов без загрузки файла целиком
+    decoder = json.JSONDecoder()
+    separators = re.compile(r"[\s,]*")
+    buffer = ""
+    position = 0
+    started = False
+    eof = False
+    while True:
+        position = separators.match(buffer, position).end()
+        if position < len(buffer):
+            if not started:
+                if buffer[position] != "[":
+                    raise ValueError("Ожидается JSON массив")
+                started = True
+                position += 1
+                continue
+            if buffer[position] == "]":
+                return
+            try:
+                record, end = decoder.raw_decode(buffer, position)
+            except ValueError:
+                if eof:
+                    raise
+            else:
+                # Значение, за которым в буфере нет разделителя, могло быть
+                # обрезано (45 из 456, 1.5 из 1.5e3): разбираем его заново
+                # после следующего чтения
+                if eof or buffer[end:end + 1] in JSON_ARRAY_DELIMITERS:
+                    position = end
+                    yield record
+                    continue
+        elif eof:
+            raise ValueError("Неожиданный конец JSON")
+        chunk = json_file.read(buffer_size)
+        eof = not chunk
+        buffer = buffer[position:] + chunk
+        position = 0
+
+
 class DataSource:
     def __init__(
-        self, source: list, object_type: InsightObjectType, key=KEY_ATTRIBUTE
+        self, source, object_type: InsightObjectType, key=KEY_ATTRIBUTE
         ):
-        self.source = source
+        # source - список записей или функция, каждый раз возвращающая
+        # новый итератор по записям (потоковое чтение файла)
         self.object_type = object_type
-        self.objects = {}
-        for object in source:
-            self.objects[object[key]] = object
+        self.key = key
+        if callable(source):
+            self.source = None
+            self.reader = source
+            self.description = getattr(source, "description", "поток")
+        else:
+            self.source = source
+            self.reader = lambda: iter(source)
+            self.description = f"{len(source)} записей"
+        self._objects = None
 
     def __str__(self):
-        return f"DataSource: {self.source}"
+        return f"DataSource: {self.object_type.name}, {self.description}"
+
+    def __iter__(self):
+        return iter(self.reader())
+
+    @property
+    def objects(self):
+        # Все записи в памяти {ключ: запись}, для потоковых источников
+        # лучше использовать iter_chunks
+        if self._objects is None:
+            self._objects = {record[self.key]: record for record in self}
+        return self._objects
+
+    def iter_chunks(self, chunk_size=10000):
+        if self._objects is not None:
+            records = iter(self._objects.items())
+        else:
+            records = ((record[self.key], record) for record in self)
+        chunk = {}
+        for key, record in records:
+            chunk[key] = record
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = {}
+        if chunk:
+            yield chunk
+
+    def get_names(self):
+        if self._objects is not None:
+            return set(self._objects)
+        return {record[self.key] for record in self}
+
+    @classmethod
+    def from_reader(cls, reader, description, object_type, key):
+        reader.description = description
+        return cls(reader, object_type, key)
+
+    @classmethod
+    def from_json(cls, path, object_type, key=KEY_ATTRIBUTE, encoding="utf-8"):
+        def reader():
+            with open(path, encoding=encoding) as json_file:
+                yield from iter_json_array(json_file)
+        return cls.from_reader(reader, path, object_type, key)
+
+    @classmethod
+    def from_jsonl(cls, path, object_type, key=KEY_ATTRIBUTE,
+                   encoding="utf-8"):
+        def reader():
+            with open(path, encoding=encoding) as jsonl_file:
+                for line in jsonl_file:
+                    if line.strip():
+                        yield json.loads(line)
+        return cls.from_reader(reader, path, object_type, key)
+
+    @classmethod
+    def from_csv(cls, path, object_type, key=KEY_ATTRIBUTE, encoding="utf-8",
+                 delimiter=",", list_separator=None):
+        # Пустые ячейки пропускаются, list_separator делит ячейку
+        # на несколько значений (например ссылки через ";")
+        def reader():
+            with open(path, encoding=encoding, newline="") as csv_file:
+                for row in csv.DictReader(csv_file, delimiter=delimiter):
+                    record = {}
+                    for attr_name, value in row.items():
+                        if value is None or value == "":
+                            continue
+                        if list_separator and list_separator in value:
+                            value = [
+                                item.strip()
+                                for item in value.split(list_separator)]
+                        record[attr_name] = value
+                    yield record
+        return cls.from_reader(reader, path, object_type, key)
 
 if __name__ == '__main__':
     print('Script Done')
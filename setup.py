@@ -6,4 +6,9 @@ setup(
     description='Модуль для работы с API Insight JIRA',
     author='Кокорников Илья', author_email='kovo@mmzavod.ru',
     py_modules=['jirainsight'],
+    # AsyncInsight работает через aiohttp, ObjectFrame ускоряет NumPy
+    extras_require={
+        'async': ['aiohttp'],
+        'numpy': ['numpy'],
+    },
 )
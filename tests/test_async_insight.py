@@ -0,0 +1,82 @@
+# Асинхронный клиент против мока Insight из benchmarks/mock_insight.py
+import os
+import sys
+import time
+import unittest
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, os.path.join(ROOT_DIR, "benchmarks"))
+
+from jirainsight import AsyncInsight, aiohttp  # noqa: E402
+from mock_insight import MockInsightServer  # noqa: E402
+
+
+@unittest.skipIf(aiohttp is None, "нет aiohttp")
+class AsyncInsightTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.server = MockInsightServer(devices=50)
+        self.url = self.server.start()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def requests(self, key):
+        return self.server.state.request_counts[key]
+
+    async def test_schema_and_objects(self):
+        async with AsyncInsight(self.url, "login", "password") as insight:
+            schema = await insight.get_schema_async("CMDB")
+            device_type = schema.get_object_type("Device")
+            objects = await insight.load_objects_async(device_type)
+            self.assertEqual(len(objects), 50)
+            await insight.get_schema_async("CMDB")
+            self.assertEqual(
+                self.requests("GET /objectschema/{id}/objecttypes/flat"), 1)
+
+    async def test_reference_values(self):
+        async with AsyncInsight(self.url, "login", "password") as insight:
+            schema = await insight.get_schema_async("CMDB")
+            device_type = schema.get_object_type("Device")
+            objects = await insight.load_objects_async(device_type)
+            insight_object = next(iter(objects.values()))
+            location, = await insight.get_value_async(
+                insight_object, "Location")
+            self.assertEqual(location.name, "loc0")
+            uplinks = await insight.get_value_async(insight_object, "Uplinks")
+            self.assertEqual([item.name for item in uplinks], ["loc1", "loc2"])
+            # Ссылки всего типа загружены одним пакетом, синхронный value
+            # дальше берёт их из кеша
+            iql_requests = self.requests("GET /iql/objects")
+            for insight_object in objects.values():
+                self.assertTrue(insight_object.attributes["Location"].value)
+            self.assertEqual(self.requests("GET /iql/objects"), iql_requests)
+            self.assertEqual(
+                await insight.get_value_async(insight_object, "Nothing", 1), 1)
+
+    async def test_bulk_update_status_and_rate(self):
+        async with AsyncInsight(self.url, "login", "password") as insight:
+            schema = await insight.get_schema_async("CMDB")
+            device_type = schema.get_object_type("Device")
+            objects = await insight.load_objects_async(device_type)
+            ports_id = device_type.get_id_object_type_attribute("Ports")
+            updates = {
+                object_id: {ports_id: 100}
+                for object_id in list(objects)[:12]}
+            started = time.monotonic()
+            results = await insight.bulk_update_async(
+                device_type, updates, rate=20)
+            elapsed = time.monotonic() - started
+            self.assertTrue(all(result.success for result in results))
+            self.assertEqual({result.status for result in results}, {200})
+            # Корзина на 20 токенов в секунду: 12 записей сразу,
+            # лимит срабатывает только после опустошения корзины
+            results = await insight.bulk_update_async(
+                device_type, updates, rate=5)
+            self.assertGreater(time.monotonic() - started - elapsed, 1)
+            self.assertEqual(objects[next(iter(updates))].get_value("Ports"),
+                             100)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,170 @@
+# Сравнение записей источника с объектами Insight без сервера:
+# метаданные и объекты схемы собраны из JSON в тесте
+import datetime
+import os
+import sys
+import unittest
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from jirainsight import (  # noqa: E402
+    DataSource, Insight, InsightSchema, Mixer, SyncPlan)
+
+SCHEMA = {"id": 1, "name": "CMDB", "objectSchemaKey": "CMDB"}
+OBJECT_TYPES = [
+    {"id": 10, "name": "Location", "objectSchemaId": 1},
+    {"id": 11, "name": "Server", "objectSchemaId": 1},
+]
+# id атрибута: (имя, тип, defaultType, тип ссылки)
+SERVER_ATTRIBUTES = {
+    111: ("Name", 0, 0, None),
+    112: ("Cores", 0, 1, None),
+    113: ("Load", 0, 3, None),
+    114: ("Active", 0, 2, None),
+    115: ("Installed", 0, 4, None),
+    116: ("Tags", 0, 10, None),
+    117: ("Location", 1, None, 10),
+    118: ("Status", 7, None, None),
+}
+
+
+def make_attribute(attribute_id, name, object_type_id, type_id=0,
+                   default_type_id=0, reference_type_id=None):
+    attribute_json = {
+        "id": attribute_id, "name": name, "type": type_id,
+        "objectType": {"id": object_type_id}}
+    if default_type_id is not None:
+        attribute_json["defaultType"] = {"id": default_type_id}
+    if reference_type_id is not None:
+        attribute_json["referenceObjectTypeId"] = reference_type_id
+    return attribute_json
+
+
+def make_object(object_id, object_type_id, name, values):
+    return {
+        "id": object_id,
+        "label": name,
+        "objectKey": f"CMDB-{object_id}",
+        "objectType": {"id": object_type_id, "objectSchemaId": 1},
+        "attributes": [
+            {"objectTypeAttributeId": attribute_id,
+             "objectAttributeValues": values_json}
+            for attribute_id, values_json in values.items()],
+    }
+
+
+def plain(*values):
+    return [{"value": value, "displayValue": value} for value in values]
+
+
+def reference(location):
+    return [{"referencedObject": {
+        "id": location["id"], "label": location["label"],
+        "objectKey": location["objectKey"]},
+        "displayValue": location["label"]}]
+
+
+class ChangeDetectionTest(unittest.TestCase):
+    def setUp(self):
+        insight = Insight("http://localhost", "login", "password")
+        insight.cache.set("metadata", "schemas", [SCHEMA])
+        self.schema = InsightSchema(insight, "CMDB")
+        attributes_json = [make_attribute(101, "Name", 10)] + [
+            make_attribute(attribute_id, name, 11, type_id, default_type_id,
+                           reference_type_id)
+            for attribute_id, (name, type_id, default_type_id,
+                               reference_type_id)
+            in SERVER_ATTRIBUTES.items()]
+        self.schema.set_metadata(OBJECT_TYPES, attributes_json)
+        self.locations = self.schema.object_types[10]
+        self.locations.load_objects_json([
+            make_object(1, 10, "msk", {101: plain("msk")}),
+            make_object(2, 10, "spb", {101: plain("spb")}),
+        ])
+        msk = self.locations.get_object("msk")
+        self.object_type = self.schema.object_types[11]
+        self.object_type.load_objects_json([make_object(3, 11, "srv1", {
+            111: plain("srv1"),
+            112: plain("8"),
+            113: plain("0.5"),
+            114: plain("true"),
+            115: plain("2026-03-01"),
+            116: plain("web", "db"),
+            117: reference(msk.object_json),
+            118: [{"status": {"id": 1, "name": "Running", "category": 1},
+                   "displayValue": "Running"}],
+        })])
+
+    def plan(self, record):
+        record = dict(record, Name="srv1")
+        mixer = Mixer(DataSource([record], self.object_type), self.schema)
+        return mixer.plan_records({"srv1": record})
+
+    def test_normalize_value(self):
+        normalize = Mixer.normalize_value
+        self.assertEqual(normalize("Integer", "8.0"), 8)
+        self.assertEqual(normalize("Integer", "восемь"), "восемь")
+        self.assertEqual(normalize("Double", "0.50"), 0.5)
+        self.assertIs(normalize("Boolean", "Да"), True)
+        self.assertIs(normalize("Boolean", "false"), False)
+        self.assertEqual(
+            normalize("Date", "01.03.2026"), datetime.date(2026, 3, 1))
+        self.assertEqual(
+            normalize("Date Time", "2026-03-01T10:00:00.000Z"),
+            datetime.datetime(2026, 3, 1, 10))
+        self.assertEqual(normalize("Select", ["web", "db"]), ["db", "web"])
+        self.assertIsNone(normalize("Text", ["", None]))
+        self.assertEqual(
+            normalize("Status", {"id": 1, "name": "Running"}), "Running")
+        self.assertEqual(normalize("Status", "Running "), "Running")
+
+    def test_unchanged_record(self):
+        plan = self.plan({
+            "Cores": 8, "Load": "0.50", "Active": "yes",
+            "Installed": "01.03.2026", "Tags": ["db", "web"],
+            "Location": "msk", "Status": "Running"})
+        self.assertEqual(plan.update, {})
+        self.assertEqual(plan.stats["unchanged"], 1)
+
+    def test_reference_by_object_key(self):
+        plan = self.plan({"Location": "CMDB-1"})
+        self.assertEqual(plan.update, {})
+        self.assertEqual(plan.references, {})
+
+    def test_changed_attributes(self):
+        plan = self.plan({
+            "Cores": 16, "Load": 0.75, "Active": False,
+            "Installed": "2026-03-02", "Tags": ["web"],
+            "Location": "spb", "Status": "Stopped"})
+        self.assertEqual(plan.update, {3: {
+            112: 16, 113: 0.75, 114: False, 115: "2026-03-02",
+            116: ["web"], 117: "CMDB-2", 118: "Stopped"}})
+        self.assertEqual(plan.stats["attributes"], 7)
+
+    def test_missing_reference(self):
+        plan = self.plan({"Location": "kzn"})
+        self.assertEqual(plan.references, {10: ["kzn"]})
+        self.assertEqual(plan.update, {3: {117: "kzn"}})
+
+    def test_plan_resolves_created_references(self):
+        # Две площадки kzn: ссылка на них остаётся именем, остальные
+        # получают objectKey
+        self.locations.load_objects_json([
+            make_object(1, 10, "msk", {101: plain("msk")}),
+            make_object(4, 10, "kzn", {101: plain("kzn")}),
+            make_object(5, 10, "kzn", {101: plain("kzn")}),
+        ])
+        plan = SyncPlan(
+            11, create={"srv2": {117: "kzn"}, "srv3": {117: ["msk", "kzn"]}},
+            update={3: {117: "msk"}}, references={10: ["kzn", "msk"]},
+            reference_attributes={117: 10})
+        with self.assertLogs(level="WARNING"):
+            plan.resolve_references(self.schema)
+        self.assertEqual(plan.create, {
+            "srv2": {117: "kzn"}, "srv3": {117: ["CMDB-1", "kzn"]}})
+        self.assertEqual(plan.update, {3: {117: "CMDB-1"}})
+        self.assertEqual(plan.references, {})
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,49 @@
+# Потоковое чтение JSON массива маленькими кусками
+import io
+import json
+import os
+import sys
+import unittest
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from jirainsight import iter_json_array  # noqa: E402
+
+RECORDS = [
+    {"Name": "dev1", "Ports": 48, "Uplinks": ["loc1", "loc2"]},
+    {"Name": "устройство 2", "Ports": 1024, "Active": True},
+    {"Name": "dev3", "Note": "текст с ] и , внутри", "Location": None},
+]
+
+
+class IterJsonArrayTest(unittest.TestCase):
+    def read(self, text, buffer_size):
+        return list(iter_json_array(io.StringIO(text), buffer_size))
+
+    def test_small_buffers(self):
+        cases = {
+            "[1, 23, 456]": [1, 23, 456],
+            '[-1.5e3, "ab", true, null, 7]': [-1500.0, "ab", True, None, 7],
+            " [ ] ": [],
+        }
+        for buffer_size in (1, 2, 3, 5, 7, 64):
+            for text, expected in cases.items():
+                self.assertEqual(self.read(text, buffer_size), expected)
+            for indent in (None, 2):
+                text = json.dumps(
+                    RECORDS, ensure_ascii=False, indent=indent)
+                self.assertEqual(self.read(text, buffer_size), RECORDS)
+
+    def test_invalid_input(self):
+        for buffer_size in (1, 4, 64):
+            with self.assertRaises(ValueError):
+                self.read('{"Name": "dev1"}', buffer_size)
+            with self.assertRaises(ValueError):
+                self.read('[{"Name": "dev1"}, 12', buffer_size)
+            with self.assertRaises(ValueError):
+                self.read('[{"Name": "dev1"}, {"Name": ', buffer_size)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+# Mixer против мока Insight из benchmarks/mock_insight.py
+import os
+import sys
+import unittest
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, os.path.join(ROOT_DIR, "benchmarks"))
+
+from jirainsight import DataSource, Insight, InsightSchema, Mixer  # noqa: E402
+from mock_insight import MockInsightServer  # noqa: E402
+
+
+class MixerTest(unittest.TestCase):
+    def setUp(self):
+        self.server = MockInsightServer(devices=20)
+        self.url = self.server.start()
+        self.insight = Insight(self.url, "login", "password")
+        self.schema = InsightSchema(self.insight, "CMDB")
+        self.object_type = self.schema.get_object_type("Device")
+        self.locations = self.schema.get_object_type("Location")
+
+    def tearDown(self):
+        self.server.stop()
+
+    def location_of(self, name):
+        insight_object = self.object_type.get_object(name)
+        return [item.name for item in insight_object.get_value("Location")]
+
+    def test_reference_by_object_key_and_id(self):
+        loc1 = self.locations.get_object("loc1")
+        loc0 = self.locations.get_object("loc0")
+        source = DataSource([
+            {"Name": "dev2", "Location": loc1.key},
+            {"Name": "dev3", "Location": str(loc0.id)},
+            {"Name": "dev5", "Location": "loc-new"},
+        ], self.object_type)
+        mixer = Mixer(source, self.schema)
+        self.assertEqual(
+            mixer.collect_missing_references(),
+            {self.locations.id: ["loc-new"]})
+        locations = len(self.locations.objects)
+        results = mixer.sync()
+        self.assertEqual(len(self.locations.objects), locations + 1)
+        created, = results["references"][self.locations.id]
+        self.assertTrue(created.success)
+        self.assertEqual(created.key, "loc-new")
+        self.assertTrue(all(result.success for result in results["update"]))
+        self.assertEqual(self.location_of("dev2"), ["loc1"])
+        self.assertEqual(self.location_of("dev3"), ["loc0"])
+        self.assertEqual(self.location_of("dev5"), ["loc-new"])
+
+    def test_bulk_update_does_not_load_object_type(self):
+        insight = Insight(self.url, "login", "password")
+        object_type = InsightSchema(insight, "CMDB").get_object_type("Device")
+        object_id = self.object_type.get_object("dev1").id
+        ports_id = object_type.get_id_object_type_attribute("Ports")
+        iql_requests = self.server.state.request_counts["GET /iql/objects"]
+        result, = object_type.bulk_update({object_id: {ports_id: 7}})
+        self.assertTrue(result.success)
+        self.assertIsNone(object_type._objects)
+        self.assertEqual(
+            self.server.state.request_counts["GET /iql/objects"],
+            iql_requests)
+        self.assertEqual(insight.get_object(object_id).get_value("Ports"), 7)
+
+if __name__ == "__main__":
+    unittest.main()
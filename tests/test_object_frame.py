@@ -0,0 +1,92 @@
+# ObjectFrame с NumPy и без него на объектах, собранных из JSON
+import os
+import sys
+import unittest
+from datetime import date
+from unittest import mock
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import jirainsight  # noqa: E402
+from jirainsight import Insight, InsightSchema  # noqa: E402
+
+SCHEMA = {"id": 1, "name": "CMDB", "objectSchemaKey": "CMDB"}
+ATTRIBUTES = [
+    {"id": 111, "name": "Name", "type": 0, "defaultType": {"id": 0}},
+    {"id": 112, "name": "Ports", "type": 0, "defaultType": {"id": 1}},
+    {"id": 113, "name": "Active", "type": 0, "defaultType": {"id": 2}},
+    {"id": 114, "name": "Installed", "type": 0, "defaultType": {"id": 4}},
+]
+ROWS = [
+    ("srv0", "8", "true", "2026-01-01"),
+    ("srv1", "24", "false", "2026-02-01"),
+    ("srv2", None, "true", None),
+    ("srv3", "48", "true", "2026-03-01"),
+    ("srv4", "24", None, "2026-02-01"),
+]
+
+
+def make_object(object_id, values):
+    return {
+        "id": object_id,
+        "label": values[0],
+        "objectKey": f"CMDB-{object_id}",
+        "objectType": {"id": 11, "objectSchemaId": 1},
+        "attributes": [
+            {"objectTypeAttributeId": attribute["id"],
+             "objectAttributeValues": [{"value": value}]}
+            for attribute, value in zip(ATTRIBUTES, values)
+            if value is not None],
+    }
+
+
+class ObjectFrameTest(unittest.TestCase):
+    def setUp(self):
+        insight = Insight("http://localhost", "login", "password")
+        insight.cache.set("metadata", "schemas", [SCHEMA])
+        schema = InsightSchema(insight, "CMDB")
+        schema.set_metadata(
+            [{"id": 11, "name": "Server", "objectSchemaId": 1}],
+            [dict(attribute, objectType={"id": 11})
+             for attribute in ATTRIBUTES])
+        object_type = schema.object_types[11]
+        object_type.load_objects_json(
+            make_object(number + 1, values)
+            for number, values in enumerate(ROWS))
+        self.frame = object_type.to_frame()
+
+    def check(self):
+        frame = self.frame
+        self.assertEqual(frame.filter("Ports", ">=", 24), [1, 3, 4])
+        self.assertEqual(frame.filter("Ports", "==", "24"), [1, 4])
+        self.assertEqual(frame.filter("Ports", "!=", 24), [0, 2, 3])
+        self.assertEqual(frame.filter("Ports", "in", [8, 48]), [0, 3])
+        self.assertEqual(frame.filter("Active", "==", True), [0, 2, 3])
+        self.assertEqual(
+            frame.filter("Installed", "<", date(2026, 2, 1)), [0])
+        self.assertEqual(
+            frame.filter("Installed", ">=", "2026-02-01"), [1, 3, 4])
+        self.assertEqual(frame.filter("Name", "in", {"srv1", "srv4"}), [1, 4])
+        self.assertEqual(frame.filter("Name", "!=", "srv1"), [0, 2, 3, 4])
+        self.assertEqual(
+            frame.filter("Ports", lambda value: value is None), [2])
+        self.assertEqual(
+            frame.count_by("Ports"), {8: 1, 24: 2, 48: 1, None: 1})
+        self.assertEqual(
+            frame.count_by("Active"), {True: 3, False: 1, None: 1})
+        self.assertEqual(frame.sum("Ports"), 104)
+        with self.assertRaises(ValueError):
+            frame.filter("Ports", "~", 1)
+
+    @unittest.skipIf(jirainsight.numpy is None, "нет numpy")
+    def test_numpy(self):
+        self.check()
+
+    def test_python(self):
+        with mock.patch.object(jirainsight, "numpy", None):
+            self.check()
+
+
+if __name__ == "__main__":
+    unittest.main()
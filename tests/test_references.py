@@ -0,0 +1,46 @@
+# Ссылочные атрибуты против мока Insight из benchmarks/mock_insight.py
+import os
+import sys
+import unittest
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, os.path.join(ROOT_DIR, "benchmarks"))
+
+from jirainsight import Insight, InsightSchema  # noqa: E402
+from mock_insight import MockInsightServer  # noqa: E402
+
+
+class ReferencesTest(unittest.TestCase):
+    def setUp(self):
+        self.server = MockInsightServer(devices=50)
+        self.url = self.server.start()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_dangling_reference_is_not_requested_again(self):
+        # Площадку loc0 удалили, ссылки на неё у устройств остались
+        state = self.server.state
+        location_id = state.by_key["CMDB-1"]["id"]
+        del state.objects[location_id]
+        state.version += 1
+        insight = Insight(self.url, "login", "password")
+        object_type = InsightSchema(insight, "CMDB").get_object_type("Device")
+        objects = list(object_type.objects.values())
+        self.assertEqual(objects[0].get_value("Location"), [])
+        self.assertEqual(
+            [item.name for item in objects[1].get_value("Location")], ["loc1"])
+        iql_requests = state.request_counts["GET /iql/objects"]
+        for insight_object in objects:
+            insight_object.get_value("Location")
+        self.assertEqual(objects[10].get_value("Location"), [])
+        self.assertEqual(
+            state.request_counts["GET /iql/objects"], iql_requests)
+        self.assertEqual(insight.get_objects([location_id], 1), {})
+        self.assertEqual(
+            state.request_counts["GET /iql/objects"], iql_requests)
+
+
+if __name__ == "__main__":
+    unittest.main()
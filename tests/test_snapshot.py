@@ -0,0 +1,67 @@
+# Снимок схемы против мока Insight из benchmarks/mock_insight.py
+import os
+import sys
+import tempfile
+import unittest
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, os.path.join(ROOT_DIR, "benchmarks"))
+
+from jirainsight import Insight, InsightSchema, SchemaSnapshot  # noqa: E402
+from mock_insight import MockInsightServer  # noqa: E402
+
+
+class SchemaSnapshotTest(unittest.TestCase):
+    def setUp(self):
+        self.server = MockInsightServer(devices=120)
+        self.url = self.server.start()
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = self.directory.name
+
+    def tearDown(self):
+        self.server.stop()
+        self.directory.cleanup()
+
+    def open_offline(self):
+        insight = Insight("http://nowhere.invalid", "login", "password")
+        return SchemaSnapshot(self.path).open_schema(insight)
+
+    def test_failed_crawl_keeps_previous_snapshot(self):
+        schema = InsightSchema(Insight(self.url, "login", "password"), "CMDB")
+        schema.snapshot(self.path, block_size=10)
+        get_page = schema.get_iql_page_json
+        pages = []
+
+        def failing_page(params, page_number):
+            # Первая страница читается, следующая падает
+            pages.append(page_number)
+            if len(pages) > 1:
+                raise ConnectionError("сеть недоступна")
+            return get_page(params, page_number)
+
+        schema.get_iql_page_json = failing_page
+        with self.assertRaises(ConnectionError):
+            schema.snapshot(self.path, block_size=10)
+        self.assertEqual(
+            sorted(name for name in os.listdir(self.path)
+                   if name.endswith(".tmp")), [])
+        offline = self.open_offline()
+        self.assertEqual(
+            len(offline.get_object_type("Device").objects), 120)
+
+    def test_open_schema_keeps_loaded_object_types(self):
+        insight = Insight(self.url, "login", "password")
+        schema = InsightSchema(insight, "CMDB")
+        schema.snapshot(self.path)
+        object_type = schema.get_object_type("Device")
+        objects = object_type.objects
+        opened = SchemaSnapshot(self.path).open_schema(
+            insight, load_objects=False)
+        self.assertIs(opened, schema)
+        self.assertIs(opened.get_object_type("Device"), object_type)
+        self.assertIs(object_type.objects, objects)
+
+
+if __name__ == "__main__":
+    unittest.main()